@@ -0,0 +1,78 @@
+import numpy as np
+
+def absorb_chain(P, levels, absorbing, Pinf=None):
+    """
+    Computes the absorbing-power of the transition matrices P (shape (..., n, n))
+    exactly, with one backward sweep over the transient states instead of a
+    matrix power.  levels are groups of transient state names, ordered so that
+    each group only leads to absorbing states or to groups listed before it;
+    absorbing are the absorbing state names.  Fills Pinf if given, and returns it.
+    """
+    if Pinf is None:
+        Pinf = np.zeros(P.shape, dtype=float)
+    else:
+        Pinf.fill(0)
+
+    absIdx = absorbing - 1
+
+    # Absorption probabilities: only the absorbing columns are ever nonzero
+    B = np.zeros(P.shape[:-1] + (len(absIdx),), dtype=float)
+    B[..., absIdx, np.arange(len(absIdx))] = 1
+
+    for states in levels:
+        idx = states - 1
+        B[..., idx, :] = P[..., idx, :] @ B
+
+    Pinf[..., absIdx] = B
+    return Pinf
+
+
+def absorb_rows(P, levels, rows, V=None, visits=None):
+    """
+    Computes only the given rows (state names) of the absorbing-power of P
+    (shape (..., n, n)), by pushing those start states forward through the
+    transient groups as vector-matrix products; levels as in absorb_chain.
+    Fills V if given, and returns it: shape (..., len(rows), n).
+    visits as in absorb_vectors.
+    """
+    n = P.shape[-1]
+    if V is None:
+        V = np.zeros(P.shape[:-2] + (len(rows), n), dtype=float)
+    else:
+        V.fill(0)
+    V[..., np.arange(len(rows)), rows - 1] = 1
+    return absorb_vectors(P, levels, V, visits)
+
+
+def absorb_vectors(P, levels, V, visits=None):
+    """
+    Pushes the start distributions V (shape (..., m, n), any mass on any
+    state) forward through the transient groups of P until all of it is
+    absorbed, in place, as absorb_rows does for unit rows.  Returns V.
+    If given, visits (shaped as V) receives the mass that passes through
+    each transient state (0 on the absorbing states).
+    """
+    if visits is not None:
+        visits.fill(0)
+    for states in reversed(levels):
+        idx = states - 1
+        mass = V[..., idx]
+        V[..., idx] = 0
+        V += mass @ P[..., idx, :]
+        if visits is not None:
+            visits[..., idx] = mass
+    return V
+
+
+def absorb_values(P, levels, U):
+    """
+    Backward counterpart of absorb_vectors: U (shape (..., m, n)) holds m
+    values of the absorbing states, and each transient state gets, in place,
+    the expected value of the absorbing state it ends in, one group at a
+    time in the order of levels.  The derivative of U . V(absorbed) with
+    respect to P[i, j] is then visits[i] * U[j].  Returns U.
+    """
+    for states in levels:
+        idx = states - 1
+        U[..., idx] = U @ np.swapaxes(P[..., idx, :], -1, -2)
+    return U
@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+import setup_variables
+from compile_topology import rules_key, strategy_key
+from adv_single_hand_batch import adv_single_hand_batch
+
+class AdvantageCache:
+    """
+    Bounded LRU cache of the player's advantage, keyed on the deck, the
+    strategy tables and the house rule flags, so a changed table never hits
+    a stale entry.  Decks are normalized first, so rank counts and
+    probabilities of the same shoe share one entry.  With quantum set, each
+    normalized deck is then rounded to a multiple of quantum (and
+    renormalized); the rounded deck is both the key and the deck evaluated,
+    so nearby shoe states share one entry.
+    """
+    def __init__(self, maxsize=4096, quantum=None):
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def advantage(self, deck, strategy, houseRules=None):
+        """
+        Player's advantage per hand for one deck distribution (10 entries).
+        houseRules defaults to setup_variables.houseRules.
+        """
+        return float(self.advantage_batch(np.atleast_2d(deck), strategy, houseRules)[0])
+
+    def advantage_batch(self, decks, strategy, houseRules=None):
+        """
+        Player's advantage per hand for an (N, 10) array of deck distributions
+        (or rank counts); the decks not in the cache are evaluated together
+        in one batch.  Raises ValueError for a deck with no cards, or none
+        left after rounding to quantum.
+        """
+        if houseRules is None:
+            houseRules = setup_variables.houseRules
+
+        decks = np.atleast_2d(np.array(decks, dtype=float))
+        total = decks.sum(axis=1, keepdims=True)
+        if np.any(total <= 0):
+            raise ValueError("every deck must hold some cards")
+        decks = decks / total
+        if self.quantum:
+            steps = np.round(decks / self.quantum)
+            total = steps.sum(axis=1, keepdims=True)
+            if np.any(total <= 0):
+                raise ValueError(f"a deck rounds to no cards at quantum {self.quantum}")
+            decks = steps / total
+            deckKeys = [row.astype(np.int64).tobytes() for row in steps]
+        else:
+            deckKeys = [row.tobytes() for row in decks]
+        tableKey = (strategy_key(strategy), rules_key(houseRules))
+        keys = [(deckKey,) + tableKey for deckKey in deckKeys]
+
+        result = np.zeros(len(decks))
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    result[i] = self._entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(i)
+                    self.misses += 1
+
+        if missing:
+            result[missing] = adv_single_hand_batch(decks[missing], strategy, houseRules=houseRules)
+            with self._lock:
+                for i in missing:
+                    self._entries[keys[i]] = result[i]
+                    self._entries.move_to_end(keys[i])
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def stats(self):
+        """
+        Snapshot of the cache counters.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
@@ -1,16 +1,19 @@
 import numpy as np
+from types import SimpleNamespace
 import setup_variables
-from calc_player_trans import calc_player_trans
-from calc_player_trans_split import calc_player_trans_split
+import stage_profile
+from calc_player_trans_split import calc_player_trans_split, resplit_probs, split_profit
 from calc_dealer_trans import calc_dealer_trans
 from compute_term_profit import compute_term_profit
 
-def adv_single_hand(deck, strategy):
+def adv_single_hand(deck, strategy, sparse=False):
     """
     Computes player's advantage per hand, given the deck distribution
     and the player's strategy.  Must call setup_variables.setup_variables() first.
+    With sparse=True the chains are built and absorbed in CSR form.
     """
     PLAYERfirst      = setup_variables.PLAYERfirst
+    PLAYERpair       = setup_variables.PLAYERpair
     PLAYERsplit      = setup_variables.PLAYERsplit
     PLAYERbj         = setup_variables.PLAYERbj
     PLAYERdoubBust   = setup_variables.PLAYERdoubBust
@@ -28,46 +31,53 @@ def adv_single_hand(deck, strategy):
     deck = np.append(deck, deck[0])
 
 
-    calc_player_trans(deck, strategy)
-    calc_player_trans_split(deck, strategy)
-    calc_dealer_trans(deck)
+    # Only the first-card rows of Pinf, PSinf and PDinf are read below; the
+    # split rows of PSinf come from the main chain, in the same pass as Pinf's
+    calc_player_trans_split(deck, strategy, full=False, sparse=sparse)
+    calc_dealer_trans(deck, full=False, sparse=sparse)
+    resplit = resplit_probs(deck, strategy)
 
 
-    dProfits   = np.zeros(11, dtype=float)
-    splitProfits = np.zeros(11, dtype=float)
+    with stage_profile.stage('term_profit'):
+        dProfits   = np.zeros(11, dtype=float)
+        splitProfits = np.zeros(11, dtype=float)
 
-    for dCard_idx in range(1, 11):
-        if deck[dCard_idx] > 0:
-            pdRow = PDinf[DEALERfirst[dCard_idx] - 1, :]
+        for dCard_idx in range(1, 11):
+            if deck[dCard_idx] > 0:
+                pdRow = PDinf[DEALERfirst[dCard_idx] - 1, :]
 
-            pRow = np.zeros(PLAYERdoubBust, dtype=float)
-            for pCard_idx in range(1, 11):  
-                p_states = Pinf[dCard_idx, PLAYERfirst[pCard_idx] - 1, :]
-                pRow += deck[pCard_idx] * p_states
+                pRow = np.zeros(PLAYERdoubBust, dtype=float)
+                for pCard_idx in range(1, 11):  
+                    p_states = Pinf[dCard_idx, PLAYERfirst[pCard_idx] - 1, :]
+                    pRow += deck[pCard_idx] * p_states
 
-            probDealerBJ = pdRow[DEALERbj - 1]
+                probDealerBJ = pdRow[DEALERbj - 1]
 
-    
-            profitDealerBJ = -1.0 * (1.0 - pRow[PLAYERbj - 1])
 
-            pdRowNoBJ = pdRow.copy()
-            pdRowNoBJ[DEALERbj - 1] = 0.0
-            pdRowNoBJ = pdRowNoBJ / np.sum(pdRowNoBJ)
+                profitDealerBJ = -1.0 * (1.0 - pRow[PLAYERbj - 1])
 
-            for ii_idx in range(1, 11):
-                pRowSplit = PSinf[dCard_idx, PLAYERfirst[ii_idx] - 1, :]
-                splitProfits[ii_idx] = compute_term_profit(pRowSplit, pdRowNoBJ)
+                pdRowNoBJ = pdRow.copy()
+                pdRowNoBJ[DEALERbj - 1] = 0.0
+                pdRowNoBJ = pdRowNoBJ / np.sum(pdRowNoBJ)
 
-            profitNoDealerBJ = compute_term_profit(pRow, pdRowNoBJ)
+                # All ten split rows (and pair rows) in one product with the payoff matrix
+                pRowSplit = PSinf[dCard_idx, PLAYERfirst[1:] - 1, :]
+                pRowPair  = PSinf[dCard_idx, PLAYERpair[1:] - 1, :]
+                splitProfits[1:] = split_profit(
+                    compute_term_profit(pRowSplit, pdRowNoBJ),
+                    compute_term_profit(pRowPair, pdRowNoBJ),
+                    resplit and SimpleNamespace(prob=resplit.prob[dCard_idx - 1], hands=resplit.hands))
 
-            for ii_idx in range(1, 11):
-                prob_split = pRow[PLAYERsplit[ii_idx] - 1]
-                profitNoDealerBJ += 2.0 * prob_split * splitProfits[ii_idx]
+                profitNoDealerBJ = compute_term_profit(pRow, pdRowNoBJ)
 
-            dProfits[dCard_idx] = (
-                probDealerBJ * profitDealerBJ
-                + (1.0 - probDealerBJ) * profitNoDealerBJ
-            )
+                for ii_idx in range(1, 11):
+                    prob_split = pRow[PLAYERsplit[ii_idx] - 1]
+                    profitNoDealerBJ += prob_split * splitProfits[ii_idx]
+
+                dProfits[dCard_idx] = (
+                    probDealerBJ * profitDealerBJ
+                    + (1.0 - probDealerBJ) * profitNoDealerBJ
+                )
 
     playerAdvantage = np.sum(dProfits * deck)
     return playerAdvantage
\ No newline at end of file
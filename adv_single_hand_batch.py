@@ -0,0 +1,162 @@
+import itertools
+import numpy as np
+import setup_variables
+from absorb_chain import absorb_rows
+from sparse_trans import absorb_rows_csr, absorb_vectors_csr
+from compile_topology import fill_trans, topology_csr
+from calc_player_trans import compile_player_trans
+from calc_player_trans_split import (compile_split_start, absorb_player_rows,
+                                     split_rows, resplit_probs, split_profit)
+from calc_dealer_trans import compile_dealer_trans
+from compute_term_profit import payoff_matrix
+
+def adv_single_hand_batch(decks, strategy, sparse=False, houseRules=None):
+    """
+    Computes player's advantage per hand for a batch of deck distributions
+    (an (N, 10) array, one deck per row), given the player's strategy.
+    Returns an array of N advantages.  Must call setup_variables.setup_variables() first.
+    The post-split rows come from the main chain (see absorb_player_rows);
+    with sparse=True the decks share one CSR pattern and only its data is
+    stacked.
+    houseRules defaults to setup_variables.houseRules.
+    """
+    PLAYERfirst      = setup_variables.PLAYERfirst
+    DEALERfirst      = setup_variables.DEALERfirst
+
+    PLAYERlevels = setup_variables.PLAYERlevels
+    DEALERlevels = setup_variables.DEALERlevels
+
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+
+    decks = np.atleast_2d(np.array(decks, dtype=float))
+
+    decks = np.concatenate([decks, decks[:, :1]], axis=1)   # shape: (N, 11)
+
+    topoP  = compile_player_trans(strategy, houseRules)
+    topoPD = compile_dealer_trans(houseRules)
+
+    # Absorb only the first-card rows, for every deck and up-card (2..11) at once
+    start = fill_trans(compile_split_start(strategy, houseRules), decks)
+    if sparse:
+        # Two passes through the main chain: on a batch, a level's temporaries
+        # grow with the rows pushed at once, and 10 at a time stay in cache
+        Pcsr    = topology_csr(topoP, decks)
+        pFirst  = absorb_rows_csr(Pcsr, PLAYERlevels, PLAYERfirst[1:])[:, 1:]
+        start   = np.concatenate([np.zeros_like(start[:, :1]), start], axis=1)   # no up-card slice 0
+        psFirst = absorb_vectors_csr(Pcsr, PLAYERlevels, start)[:, 1:]
+        pdRow   = absorb_rows_csr(topology_csr(topoPD, decks), DEALERlevels, DEALERfirst[1:])[:, 0]
+    else:
+        # Stacked transition matrices: (N, 10, 122, 122) and (N, 37, 37)
+        P     = fill_trans(topoP, decks)[:, 1:]
+        PD    = fill_trans(topoPD, decks)
+
+        V       = absorb_player_rows(P, start)
+        pFirst  = V[..., :10, :]
+        psFirst = V[..., 10:, :]
+        pdRow   = absorb_rows(PD, DEALERlevels, DEALERfirst[1:])
+
+    return fold_advantage(decks[:, 1:], pFirst, psFirst, pdRow, resplit_probs(decks, strategy, houseRules))
+
+
+def adv_single_hand_stream(decks, strategy, chunkSize=8, houseRules=None):
+    """
+    Streaming form of adv_single_hand_batch for any number of deck
+    distributions: decks is an iterable (a generator, or an (N, 10) array)
+    of 10-entry decks, taken chunkSize at a time.  Each chunk is filled into
+    the same preallocated transition stacks and absorbed into the same row
+    buffers, so peak memory is set by chunkSize (about 1.4 MB per deck)
+    and not by the number of decks.  Small chunks that stay in cache are
+    also faster than one big stack.
+    Yields an array of advantages per chunk, in input order.
+    """
+    DEALERfirst  = setup_variables.DEALERfirst
+    DEALERlevels = setup_variables.DEALERlevels
+
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    splitRows = split_rows(houseRules)
+
+    topoP     = compile_player_trans(strategy, houseRules)
+    topoStart = compile_split_start(strategy, houseRules)
+    topoPD    = compile_dealer_trans(houseRules)
+
+    nP = setup_variables.numPlayerStates
+    nD = setup_variables.numDealerStates
+
+    # Workspaces, reused by every chunk
+    P       = np.zeros((chunkSize, 11, nP, nP))
+    start   = np.zeros((chunkSize, 10, len(splitRows), nP))
+    PD      = np.zeros((chunkSize, nD, nD))
+    V       = np.zeros((chunkSize, 10, 10 + len(splitRows), nP))
+    pdRow   = np.zeros((chunkSize, 10, nD))
+
+    decks = iter(decks)
+    while True:
+        chunk = np.array(list(itertools.islice(decks, chunkSize)), dtype=float)
+        n = len(chunk)
+        if n == 0:
+            return
+        chunk = np.concatenate([chunk, chunk[:, :1]], axis=1)   # shape: (n, 11)
+
+        fill_trans(topoP, chunk, P[:n])
+        fill_trans(topoStart, chunk, start[:n])
+        fill_trans(topoPD, chunk, PD[:n])
+
+        absorb_player_rows(P[:n, 1:], start[:n], V[:n])
+        absorb_rows(PD[:n], DEALERlevels, DEALERfirst[1:], pdRow[:n])
+
+        yield fold_advantage(chunk[:, 1:], V[:n, :, :10], V[:n, :, 10:], pdRow[:n],
+                             resplit_probs(chunk, strategy, houseRules))
+
+
+def fold_advantage(probs, pFirst, psFirst, pdRow, resplit=None):
+    """
+    Folds absorbed first-card rows into the player's advantage per hand.
+    probs (..., 10) are the probabilities of cards 2..11; for each dealer
+    up-card 2..11, pFirst and psFirst (..., 10, 10, 122) hold the first-card
+    rows of Pinf and PSinf, and pdRow (..., 10, 37) the first-card row of PDinf.
+    With resplit (see calc_player_trans_split.resplit_probs) psFirst holds
+    the pair rows of PSinf after the first-card rows (..., 10, 20, 122).
+    Returns an array of shape (...).
+    """
+    dProfits = fold_profits(probs, pFirst, psFirst, pdRow, resplit)
+    playerAdvantage = np.sum(dProfits * probs, axis=-1)
+    return playerAdvantage
+
+
+def fold_profits(probs, pFirst, psFirst, pdRow, resplit=None):
+    """
+    As fold_advantage, but returns the player's expected profit for each
+    dealer up-card 2..11, shape (..., 10) (0 for an up-card with probability 0).
+    """
+    PLAYERsplit      = setup_variables.PLAYERsplit
+    PLAYERbj         = setup_variables.PLAYERbj
+    DEALERbj         = setup_variables.DEALERbj
+
+    probDealerBJ = pdRow[..., DEALERbj - 1]
+
+    pRow = np.einsum('...k,...dks->...ds', probs, pFirst)   # (..., 10, 122)
+
+    profitDealerBJ = -1.0 * (1.0 - pRow[..., PLAYERbj - 1])
+
+    pdRowNoBJ = pdRow.copy()
+    pdRowNoBJ[..., DEALERbj - 1] = 0.0
+    norm = np.sum(pdRowNoBJ, axis=-1, keepdims=True)
+    pdRowNoBJ = np.divide(pdRowNoBJ, norm, out=np.zeros_like(pdRowNoBJ), where=norm > 0)
+
+    # Profit of each player terminal state per up-card: pRow @ W @ pdRow for every row at once
+    stateProfits = pdRowNoBJ @ payoff_matrix().T                           # (..., 10, 122)
+
+    splitRows = np.einsum('...is,...s->...i', psFirst, stateProfits)       # (..., 10, 10 or 20)
+    splitProfits = split_profit(splitRows[..., :10], splitRows[..., 10:], resplit)
+
+    profitNoDealerBJ = np.einsum('...s,...s->...', pRow, stateProfits)
+    profitNoDealerBJ += np.sum(pRow[..., PLAYERsplit[1:] - 1] * splitProfits, axis=-1)
+
+    dProfits = (
+        probDealerBJ * profitDealerBJ
+        + (1.0 - probDealerBJ) * profitNoDealerBJ
+    )
+    dProfits = np.where(probs > 0, dProfits, 0.0)
+    return dProfits
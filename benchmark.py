@@ -0,0 +1,351 @@
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from set_strategy import set_strategy
+from calc_player_trans import calc_player_trans
+from calc_player_trans_split import calc_player_trans_split
+from calc_dealer_trans import calc_dealer_trans
+from compute_term_profit import compute_term_profit
+from adv_single_hand import adv_single_hand
+from adv_single_hand_batch import adv_single_hand_batch, adv_single_hand_stream
+from engine import Engine
+from shoe_tracker import ShoeTracker
+from optimal_strategy import action_evs
+from simulate import simulate
+from finite_shoe import FiniteShoe
+from deviation_indices import TAG_SYSTEMS, deviation_indices, count_deck, move_class
+
+# Published house edge against basic strategy under the default rules
+PUBLISHED_ADVANTAGE = -0.0057
+PUBLISHED_TOLERANCE = 0.00005
+
+# Rank counts A, 2..10 of the benchmarked compositions
+COMPOSITIONS = {
+    'single-deck': [4, 4, 4, 4, 4, 4, 4, 4, 4, 16],
+    'six-deck':    [24, 24, 24, 24, 24, 24, 24, 24, 24, 96],
+    'skewed':      [20, 14, 15, 14, 13, 16, 24, 24, 22, 90],   # six decks with many low cards already dealt
+}
+# Compositions in the proportions of a full shoe, which must reproduce the published edge
+FULL_SHOE = ('single-deck', 'six-deck')
+
+# House rule flags varied by the correctness checks (--check)
+CHECK_FLAGS = ('DSSS', 'DASA', 'MSA', 'HASAA', 'SRA')
+# Largest difference allowed between two evaluation paths, or against a saved grid
+CHECK_TOLERANCE = 1e-12
+# Rank counts A, 2..10 of a deck rich in 8s, where resplitting moves the advantage by about 2%
+PAIR_RICH = [4, 4, 4, 4, 4, 4, 4, 24, 4, 16]
+# Rank counts A, 2..10 of a shoe small enough for FiniteShoe to play splits hand by hand in a second
+SMALL_SHOE = [1, 2, 2, 2, 2, 2, 1, 2, 2, 6]
+
+STAGES = ('setup_variables', 'calc_player_trans', 'calc_player_trans_split',
+          'calc_dealer_trans', 'compute_term_profit', 'adv_single_hand')
+
+def run_benchmarks(repeats=20):
+    """
+    Times every pipeline stage on every composition (best and median of
+    repeats calls, after one warm-up call, so the compiled topologies are
+    cached) and records the advantage returned by the timed adv_single_hand calls.
+    """
+    setup_variables.setup_variables()
+    strategy = set_strategy('basic')
+
+    results = {'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'machine': platform.machine(), 'repeats': repeats},
+               'timings': {}, 'advantage': {}}
+
+    for name, counts in COMPOSITIONS.items():
+        deck = np.array(counts, dtype=float) / np.sum(counts)
+        deck11 = np.append(deck, deck[0])
+
+        calc_player_trans(deck11, strategy, full=False)
+        calc_dealer_trans(deck11, full=False)
+        pRow  = deck11[1:] @ setup_variables.Pinf[1:, setup_variables.PLAYERfirst[1:] - 1, :]
+        pdRow = setup_variables.PDinf[setup_variables.DEALERfirst[1:] - 1, :]
+
+        stages = {
+            'setup_variables':         setup_variables.setup_variables,
+            'calc_player_trans':       lambda: calc_player_trans(deck11, strategy),
+            'calc_player_trans_split': lambda: calc_player_trans_split(deck11, strategy),
+            'calc_dealer_trans':       lambda: calc_dealer_trans(deck11),
+            'compute_term_profit':     lambda: compute_term_profit(pRow, pdRow),
+            'adv_single_hand':         lambda: adv_single_hand(deck, strategy),
+        }
+
+        results['timings'][name] = {}
+        for stage in STAGES:
+            seconds, value = _time_calls(stages[stage], repeats)
+            results['timings'][name][stage] = {'best': min(seconds), 'median': float(np.median(seconds))}
+            if stage == 'adv_single_hand':
+                results['advantage'][name] = value
+    return results
+
+
+def check_results(results, baseline=None, tolerance=0.25):
+    """
+    Lists the problems with a benchmark run: a full-shoe composition off the
+    published advantage, an advantage that moved from the baseline's, or a
+    stage whose best time is more than tolerance (fraction) slower than the baseline's.
+    """
+    problems = []
+    for name, adv in results['advantage'].items():
+        if name in FULL_SHOE and abs(adv - PUBLISHED_ADVANTAGE) > PUBLISHED_TOLERANCE:
+            problems.append(f"{name}: advantage {adv:.6%} is off the published {PUBLISHED_ADVANTAGE:.2%}")
+        if baseline is not None and name in baseline['advantage']:
+            if abs(adv - baseline['advantage'][name]) > 1e-12:
+                problems.append(f"{name}: advantage {adv!r} differs from the baseline's "
+                                f"{baseline['advantage'][name]!r}")
+
+    if baseline is not None:
+        for name, stages in results['timings'].items():
+            for stage, t in stages.items():
+                old = baseline['timings'].get(name, {}).get(stage)
+                if old is not None and t['best'] > old['best'] * (1 + tolerance):
+                    problems.append(f"{name}/{stage}: {t['best'] * 1e3:.3f} ms vs baseline "
+                                    f"{old['best'] * 1e3:.3f} ms")
+    return problems
+
+
+def check_rule_grid(baseline=None):
+    """
+    Correctness checks over every combination of CHECK_FLAGS and every
+    composition; returns the list of problems found and the grid of
+    adv_single_hand advantages (rules label -> composition -> advantage):
+    every evaluation path (adv_single_hand and adv_single_hand_batch, dense
+    and sparse, adv_single_hand_stream, the Engine's advantage, distribution
+    and gradient, and ShoeTracker) must give the same basic strategy
+    advantage, and that of a saved grid baseline (--save, from another
+    revision) if given; and the strategy set_strategy('optimal') solves for
+    a composition must not score below basic strategy on it, its EVs
+    giving the advantage Engine.advantage finds for it (see _solver_advantage).
+    """
+    setup_variables.setup_variables()
+    houseRules = setup_variables.houseRules
+    problems = []
+    grid = {}
+    try:
+        for flags in itertools.product((0, 1), repeat=len(CHECK_FLAGS)):
+            rules = SimpleNamespace(**vars(houseRules))
+            for flag, value in zip(CHECK_FLAGS, flags):
+                setattr(rules, flag, value)
+            label = ' '.join(f"{flag}={value}" for flag, value in zip(CHECK_FLAGS, flags))
+            basic = set_strategy('basic', rules)
+            engine = Engine(rules, basic)
+            tracker = ShoeTracker(rules=rules, strategy=basic)
+
+            # adv_single_hand reads the rules from setup_variables
+            setup_variables.houseRules = rules
+            decks = np.array(list(COMPOSITIONS.values()), dtype=float)
+            decks /= np.sum(decks, axis=-1, keepdims=True)
+            paths = {
+                'adv_single_hand':        [adv_single_hand(deck, basic) for deck in decks],
+                'adv_single_hand sparse': [adv_single_hand(deck, basic, True) for deck in decks],
+                'batch':                  adv_single_hand_batch(decks, basic, False, rules),
+                'batch sparse':           adv_single_hand_batch(decks, basic, True, rules),
+                'stream':                 np.concatenate(list(adv_single_hand_stream(decks, basic, 2, rules))),
+                'Engine.advantage':       [engine.advantage(deck) for deck in decks],
+                'Engine.distribution':    [engine.distribution(deck).advantage for deck in decks],
+                'Engine.gradient':        [engine.gradient(deck).advantage for deck in decks],
+            }
+            setup_variables.houseRules = houseRules
+            tracked = []
+            for counts in COMPOSITIONS.values():
+                tracker.reset(counts=counts)
+                tracked.append(tracker.advantage)
+            paths['ShoeTracker'] = tracked
+
+            grid[label] = dict(zip(COMPOSITIONS, map(float, paths['adv_single_hand'])))
+            for path, advs in paths.items():
+                for name, adv, ref in zip(COMPOSITIONS, advs, paths['adv_single_hand']):
+                    if not abs(adv - ref) <= CHECK_TOLERANCE:
+                        problems.append(f"{label} {name}: {path} gives {adv:.15f}, "
+                                        f"adv_single_hand {ref:.15f}")
+            if baseline is not None:
+                for name, adv in grid[label].items():
+                    ref = baseline.get(label, {}).get(name)
+                    if ref is not None and not abs(adv - ref) <= CHECK_TOLERANCE:
+                        problems.append(f"{label} {name}: advantage {adv:.15f}, baseline {ref:.15f}")
+
+            for name, deck, advBasic in zip(COMPOSITIONS, decks, paths['batch']):
+                optimal = set_strategy('optimal', rules, deck)
+                advOptimal = adv_single_hand_batch(deck, optimal, False, rules)[0]
+                if advOptimal < advBasic - 1e-12:
+                    problems.append(f"{label} {name}: optimal strategy {advOptimal:.6%} "
+                                    f"scores below basic {advBasic:.6%}")
+                advSolver = _solver_advantage(optimal.EV, deck)
+                if not abs(advSolver - advOptimal) <= CHECK_TOLERANCE:
+                    problems.append(f"{label} {name}: the solver's EVs give {advSolver:.15f}, "
+                                    f"its strategy scores {advOptimal:.15f}")
+    finally:
+        setup_variables.houseRules = houseRules
+    return problems, grid
+
+
+def check_simulator(hands=2_000_000, seed=0, sigmas=4.0):
+    """
+    Compares simulate, drawing independently from the PAIR_RICH deck as the
+    chains assume, with Engine.advantage for basic strategy with and without
+    resplitting (MSA): a gap of more than sigmas standard errors is a problem.
+    """
+    setup_variables.setup_variables()
+    deck = np.array(PAIR_RICH, dtype=float) / np.sum(PAIR_RICH)
+    problems = []
+    for msa in (0, 1):
+        rules = SimpleNamespace(**vars(setup_variables.houseRules))
+        rules.MSA = msa
+        basic = set_strategy('basic', rules)
+        result = simulate(basic, hands, deck=deck, houseRules=rules, seed=seed)
+        adv = Engine(rules, basic).advantage(deck)
+        if abs(result.advantage - adv) > sigmas * result.stderr:
+            problems.append(f"MSA={msa}: simulate gives {result.advantage:.4%} +- {result.stderr:.4%}, "
+                            f"Engine {adv:.4%}")
+    return problems
+
+
+def check_finite_shoe():
+    """
+    FiniteShoe doubles the first hand of a split; with MSA and MSH=2 it
+    deals both hands their second card and plays each on (see
+    FiniteShoe._split), without resplits.  Both must give the same
+    advantage on SMALL_SHOE, with and without HASAA.
+    """
+    setup_variables.setup_variables()
+    problems = []
+    for hasaa in (0, 1):
+        advs = []
+        for msa in (0, 1):
+            rules = SimpleNamespace(**vars(setup_variables.houseRules))
+            rules.MSA, rules.MSH, rules.HASAA = msa, 2, hasaa
+            advs.append(FiniteShoe(rules, set_strategy('basic', rules)).advantage(SMALL_SHOE))
+        if not abs(advs[0] - advs[1]) <= CHECK_TOLERANCE:
+            problems.append(f"HASAA={hasaa}: FiniteShoe doubling a split hand gives {advs[0]:.15f}, "
+                            f"playing both {advs[1]:.15f}")
+    return problems
+
+
+def check_deviation_indices(tags=TAG_SYSTEMS['hilo'], decks=6, counts=np.arange(-10, 10.5, 0.5)):
+    """
+    Lists the cells whose best move both matches and leaves basic strategy
+    on the true count grid but get no index from deviation_indices.
+    """
+    setup_variables.setup_variables()
+    houseRules = setup_variables.houseRules
+    strategy = set_strategy('basic', houseRules)
+    found = {(r['table'], r['row'], r['upcard']) for r in deviation_indices(tags, decks, counts)}
+
+    EV = action_evs(count_deck(tags, counts, decks), houseRules)
+    problems = []
+    for table, first in (('HARD', 4), ('SOFT', 12), ('PAIR', 2)):
+        best = move_class(getattr(EV.strategy, table), houseRules)
+        base = move_class(getattr(strategy, table), houseRules)
+        for row, up in np.ndindex(base.shape):
+            path = best[:, row, up]
+            changes = np.any(path == base[row, up]) and np.any(path != base[row, up])
+            if changes and (table, row + first, up + 2) not in found:
+                problems.append(f"{table} {row + first} vs {up + 2}: best move changes on the grid but has no index")
+    return problems
+
+
+def _solver_advantage(EV, deck):
+    """
+    Advantage for one deck that the EVs of action_evs give the strategy
+    solved with them: each two-card hand at the EV of its cell's move
+    against no dealer blackjack, blackjacks settled apart.
+    """
+    mv = setup_variables.playerMoves
+    p = np.append(deck[1:], deck[0]) / np.sum(deck)        # cards 2..11
+    playerBJ = 2 * p[8] * p[9]
+
+    adv = 0.0
+    for up in range(10):
+        dealerBJ = {8: p[9], 9: p[8]}.get(up, 0.0)
+        play = 0.0
+        for i, j in itertools.product(range(10), repeat=2):
+            tot = i + j + 4
+            if i == j:
+                table, row = 'PAIR', i
+            elif tot == 21 and 9 in (i, j):
+                continue
+            elif 9 in (i, j):
+                table, row = 'SOFT', tot - 12
+            else:
+                table, row = 'HARD', tot - 4
+            move = getattr(EV.strategy, table)[row, up]
+            play += p[i] * p[j] * getattr(EV, table)[row, up, mv.DB if move == mv.DS else move]
+        adv += p[up] * (dealerBJ * (playerBJ - 1) + (1 - dealerBJ) * (play + 1.5 * playerBJ))
+    return adv
+
+
+def print_results(results, baseline=None):
+    print(f"{'composition':<13} {'stage':<25} {'best ms':>9} {'median ms':>10} {'vs base':>8}")
+    for name, stages in results['timings'].items():
+        for stage, t in stages.items():
+            old = baseline['timings'].get(name, {}).get(stage) if baseline else None
+            ratio = f"{t['best'] / old['best']:.2f}x" if old else ''
+            print(f"{name:<13} {stage:<25} {t['best'] * 1e3:>9.3f} {t['median'] * 1e3:>10.3f} {ratio:>8}")
+    for name, adv in results['advantage'].items():
+        print(f"advantage {name:<13} {adv:.6%}")
+
+
+def _time_calls(func, repeats):
+    value = func()
+    seconds = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        value = func()
+        seconds.append(time.perf_counter() - t0)
+    return seconds, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and check the advantage.")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--baseline', default=None, help="JSON baseline to compare against")
+    parser.add_argument('--save', default=None, help="write this run as a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction (default: 0.25)")
+    parser.add_argument('--check', action='store_true',
+                        help="run the correctness checks over the rule grid instead of the timings "
+                        "(--baseline and --save then hold the grid of advantages)")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)['grid']
+        problems, grid = check_rule_grid(baseline)
+        problems += check_simulator() + check_finite_shoe() + check_deviation_indices()
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'grid': grid}, f, indent=2)
+        for problem in problems:
+            print("FAIL:", problem)
+        print(f"{len(problems)} problems")
+        return 1 if problems else 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args.repeats)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    problems = check_results(results, baseline, args.tolerance)
+    for problem in problems:
+        print("FAIL:", problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,60 @@
 import numpy as np
-from numpy.linalg import matrix_power
 import setup_variables
-import matplotlib.pyplot as plt
+import stage_profile
+from absorb_chain import absorb_chain, absorb_rows
+from sparse_trans import absorb_rows_csr
+from compile_topology import cached_topology, rules_key, fill_trans, topology_csr
 
-def calc_dealer_trans(deck):
+def calc_dealer_trans(deck, full=True, sparse=False):
     """
     Builds the dealer's transition matrix (PD) and its absorbing-power (PDinf) given the deck distribution. 
     Populates setup_variables.PD and setup_variables.PDinf.
+    With full=False only the first-card rows of PDinf are computed.
+    With sparse=True the chain is built and absorbed in CSR form, stored in
+    setup_variables.PDcsr instead of the dense setup_variables.PD.
+    """
+    PD    = setup_variables.PD    # shape: (37, 37)
+    PDinf = setup_variables.PDinf # shape: (37, 37)
+
+    DEALERlevels = setup_variables.DEALERlevels
+    first        = setup_variables.DEALERfirst[1:]
+
+    with stage_profile.stage('build_PD'):
+        topo = compile_dealer_trans()
+        if sparse:
+            setup_variables.PDcsr = topology_csr(topo, deck)
+        else:
+            fill_trans(topo, deck, PD)
+
+    # --- Compute PDinf (absorbing probabilities) ---
+    with stage_profile.stage('absorb_PD'):
+        PDinf.fill(0)
+        if sparse:
+            rows = np.arange(1, PD.shape[-1] + 1) if full else first
+            PDinf[rows - 1, :] = absorb_rows_csr(setup_variables.PDcsr, DEALERlevels, rows)[0]
+        elif full:
+            absorb_chain(PD, DEALERlevels, setup_variables.DEALERabsorbing, PDinf)
+        else:
+            PDinf[first - 1, :] = absorb_rows(PD, DEALERlevels, first)
+
+
+def compile_dealer_trans(houseRules=None):
+    """
+    Compiled topology of the dealer's transitions for the house rules (default:
+    setup_variables.houseRules), see compile_topology.compile_topology.  Cached per rule set.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    n = setup_variables.numDealerStates
+    key = ('dealer', rules_key(houseRules))
+    return cached_topology(key, lambda deck, T: build_dealer_trans(deck, T, houseRules), (n, n))
+
+
+def build_dealer_trans(deck, PD, houseRules=None):
+    """
+    Fills PD (shape (37, 37)) with the dealer's transition matrix for the given deck distribution.
+    Run once per rule set by compile_dealer_trans; calls then scatter into its topology.
+    houseRules defaults to setup_variables.houseRules.
     """
     DEALERfirst      = setup_variables.DEALERfirst
     DEALERhard       = setup_variables.DEALERhard
@@ -15,10 +63,8 @@ def calc_dealer_trans(deck):
     DEALERbj         = setup_variables.DEALERbj
     DEALERbust       = setup_variables.DEALERbust
 
-    houseRules = setup_variables.houseRules
-
-    PD    = setup_variables.PD    # shape: (37, 37)
-    PDinf = setup_variables.PDinf # shape: (37, 37)
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
 
     PD.fill(0)
 
@@ -102,58 +148,4 @@ def calc_dealer_trans(deck):
     # If “Dealer stands on soft 17” (DSSS), override the soft-17 row
     if houseRules.DSSS:
         PD[DEALERsoft[16] - 1, :] = 0            
-        PD[DEALERsoft[16] - 1, DEALERstand[16] - 1] = 1 
-
-    # --- Compute PDinf = PD^17 ---
-    PDinf[:,:] = matrix_power(PD, 17)
-
-
-
-
-    '''# Plot the dealer's transition matrix
-    num_states = DEALERbust  # 37
-    labels = [''] * num_states
-
-    # first2…first11
-    for i in range(2, 12):
-        idx = DEALERfirst[i - 1] - 1
-        labels[idx] = f"first{i}"
-
-    # hard4…hard17
-    for i in range(4, 18):
-        idx = DEALERhard[i - 1] - 1
-        labels[idx] = f"hard{i}"
-
-    # soft12…soft17
-    for i in range(12, 18):
-        idx = DEALERsoft[i - 1] - 1
-        labels[idx] = f"soft{i}"
-
-    # stand17…stand21
-    for i in range(17, 22):
-        idx = DEALERstand[i - 1] - 1
-        labels[idx] = f"stand{i}"
-
-    # blackjack and bust
-    labels[DEALERbj   - 1] = 'bj'
-    labels[DEALERbust - 1] = 'bust'
-
-    fig, ax = plt.subplots(figsize=(10, 10))
-    cax = ax.imshow(PDinf, cmap='jet', interpolation='nearest', vmin=0, vmax=1)
-    fig.colorbar(cax, ax=ax, shrink=0.75, label='')
-
-    ax.set_xticks(np.arange(num_states))
-    ax.set_yticks(np.arange(num_states))
-    ax.set_xticklabels(labels, rotation=90, fontsize=6)
-    ax.set_yticklabels(labels, fontsize=6)
-
-    ax.xaxis.tick_top()                                
-    ax.tick_params(axis='x', labeltop=True, labelbottom=False)  
-
-    plt.tight_layout()
-    plt.show()
-
-
-setup_variables.setup_variables()
-
-calc_dealer_trans(np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 4, 1], dtype=float) / 13)'''
\ No newline at end of file
+        PD[DEALERsoft[16] - 1, DEALERstand[16] - 1] = 1
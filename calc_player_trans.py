@@ -1,14 +1,66 @@
 import numpy as np
-from numpy.linalg import matrix_power
 import setup_variables
-import matplotlib.pyplot as plt
-import set_strategy
+import stage_profile
+from absorb_chain import absorb_chain, absorb_rows
+from sparse_trans import absorb_rows_csr
+from compile_topology import cached_topology, rules_key, strategy_key, fill_trans, topology_csr
 
-def calc_player_trans(deck, strategy):
+def calc_player_trans(deck, strategy, full=True, sparse=False):
     """
     Given the deck pdf and a strategy namespace (with PAIR, HARD, SOFT arrays),
     computes the players's transition matrix (P) and its absorbing-power (Pinf).
     Populates setup_variables.P and setup_variables.Pinf in place.
+    With full=False only the first-card rows of Pinf are computed.
+    With sparse=True the chain is built and absorbed in CSR form, stored in
+    setup_variables.Pcsr instead of the dense setup_variables.P.
+    """
+    P    = setup_variables.P      # shape: (11, 122, 122)
+    Pinf = setup_variables.Pinf   # shape: (11, 122, 122)
+
+    PLAYERlevels = setup_variables.PLAYERlevels
+    first        = setup_variables.PLAYERfirst[1:]
+
+    with stage_profile.stage('build_P'):
+        topo = compile_player_trans(strategy)
+        if sparse:
+            setup_variables.Pcsr = topology_csr(topo, deck)
+        else:
+            fill_trans(topo, deck, P)
+
+    # --- Compute Pinf (absorbing probabilities) ---
+    with stage_profile.stage('absorb_P'):
+        Pinf.fill(0)
+        if sparse:
+            rows = np.arange(1, P.shape[-1] + 1) if full else first
+            Pinf[1:, rows - 1, :] = absorb_rows_csr(setup_variables.Pcsr, PLAYERlevels, rows)[1:]
+        elif full:
+            absorb_chain(P[1:], PLAYERlevels, setup_variables.PLAYERabsorbing, Pinf[1:])
+        else:
+            Pinf[1:, first - 1, :] = absorb_rows(P[1:], PLAYERlevels, first)
+
+
+def compile_player_trans(strategy, houseRules=None):
+    """
+    Compiled topology of the player's transitions for the strategy and the
+    house rules (default: setup_variables.houseRules), see
+    compile_topology.compile_topology.  Cached per table.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    n = setup_variables.numPlayerStates
+    key = ('player', rules_key(houseRules), strategy_key(strategy))
+    return cached_topology(key, lambda deck, T: build_player_trans(deck, strategy, T, houseRules), (11, n, n))
+
+
+def build_player_trans(deck, strategy, P, houseRules=None):
+    """
+    Fills P (shape (11, 122, 122)) with the player's transition matrices for
+    the given deck pdf and strategy, one slice per dealer up-card.
+    The rows a hand can take (hit, double, stand, surrender, split) depend
+    only on its total, so each is built once per state and the strategy
+    tables pick one per up-card for all ten slices at once.
+    Run once per table by compile_player_trans; calls then scatter into its topology.
+    houseRules defaults to setup_variables.houseRules.
     """
     PLAYERfirst      = setup_variables.PLAYERfirst
     PLAYERtwoHard    = setup_variables.PLAYERtwoHard
@@ -24,12 +76,10 @@ def calc_player_trans(deck, strategy):
     PLAYERbust       = setup_variables.PLAYERbust
     PLAYERdoubBust   = setup_variables.PLAYERdoubBust
 
-    houseRules  = setup_variables.houseRules
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
     playerMoves = setup_variables.playerMoves
 
-    P    = setup_variables.P      # shape: (11, 122, 122)
-    Pinf = setup_variables.Pinf   # shape: (11, 122, 122)
-
     SRA   = houseRules.SRA
 
     SR = playerMoves.SR
@@ -85,275 +135,74 @@ def calc_player_trans(deck, strategy):
                     to_idx = PLAYERtwoHard[new_tot - 1] - 1
             P[:, from_idx, to_idx] += prob
 
-    # --- Set twoHard transitions ---
-    for ii in range(4, 22):
-        from_idx = PLAYERtwoHard[ii - 1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = HARD[ii - 4, dCard - 2]
-            if move == SR and not SRA:
-                move = H
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[ii - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew - 1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot - 1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew - 1]
-                    if new_tot > 21:
-                        to_idx = PLAYERdoubBust - 1
-                    else:
-                        to_idx = PLAYERdoubStand[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in twoHard")
-
-    # --- Set hard transitions ---
-    for ii in range(5, 22):
-        from_idx = PLAYERhard[ii - 1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move  = HARD[ii - 4, dCard - 2] 
-            if move == SR or move == DB:
-                move = H
-            elif move == DS:
-                move = S
-            if move == S:
-                to_idx = PLAYERstand[ii - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew - 1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot - 1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
+    def rows(tot, soft, ii=None):
+        # Rows of each move from a total, indexed by move code (split only for a pair of ii)
+        R = np.zeros((6, P.shape[-1]))
+        for pNew in range(2, 12):
+            new_tot, new_soft = hit_total(tot, soft, pNew)
+            prob = deck[pNew - 1]
+            if new_tot > 21:
+                R[H, PLAYERbust - 1] += prob
+                R[DB, PLAYERdoubBust - 1] += prob
             else:
-                raise ValueError(f"Unknown move {move} in hard")
-
-    # --- Set twoSoft transitions ---
+                R[H, (PLAYERsoft if new_soft else PLAYERhard)[new_tot - 1] - 1] += prob
+                R[DB, PLAYERdoubStand[new_tot - 1] - 1] += prob
+        R[DS] = R[DB]
+        R[S, PLAYERstand[tot - 1] - 1] = 1.0
+        R[SR, PLAYERsurrender - 1] = 1.0
+        if ii is not None:
+            R[SP, PLAYERsplit[ii - 1] - 1] = 1.0
+        return R
+
+    def moves(table, allowed, name, twoCard):
+        # The table's moves (one row per total, one column per up-card) as played from a state
+        bad = ~np.isin(table, allowed)
+        if np.any(bad):
+            raise ValueError(f"Unknown move {table[bad][0]} in {name}")
+        if twoCard:
+            return np.where((table == SR) & (not SRA), H, table)
+        # After the first two cards: a double hits or stands, surrender hits
+        return np.where(np.isin(table, (SR, DB)), H, np.where(table == DS, S, table))
+
+    up = np.arange(1, 11)   # dealer up-card slices 2..11
+    totalMoves = (S, H, DB, DS, SR)
+
+    # --- Set twoHard and hard transitions ---
+    twoHard = moves(HARD, totalMoves, 'twoHard', True)
+    hard    = moves(HARD, totalMoves, 'hard', False)
+    for ii in range(4, 22):
+        R = rows(ii, False)
+        P[up, PLAYERtwoHard[ii - 1] - 1] = R[twoHard[ii - 4]]
+        if ii >= 5:
+            P[up, PLAYERhard[ii - 1] - 1] = R[hard[ii - 4]]
+
+    # --- Set twoSoft and soft transitions ---
+    twoSoft = moves(SOFT, totalMoves, 'twoSoft', True)
+    soft    = moves(SOFT, totalMoves, 'soft', False)
     for ii in range(12, 22):
-        from_idx = PLAYERtwoSoft[ii - 1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move  = SOFT[ii - 12, dCard - 2]
-            if move == SR and not SRA:
-                move = H
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[ii - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew - 1]
-                    to_idx = (PLAYERsoft[new_tot - 1] - 1) if new_soft else (PLAYERhard[new_tot - 1] - 1)
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew - 1]
-                    to_idx = PLAYERdoubStand[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in twoSoft")
-
-    # --- Set soft transitions ---
-    for ii in range(13, 22):
-        from_idx = PLAYERsoft[ii - 1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move  = SOFT[ii - 12, dCard - 2]
-            if move == SR or move == DB:
-                move = H
-            elif move == DS:
-                move = S
-            if move == S:
-                to_idx = PLAYERstand[ii - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew - 1]
-                    to_idx = (PLAYERsoft[new_tot - 1] - 1) if new_soft else (PLAYERhard[new_tot - 1] - 1)
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in soft")
+        R = rows(ii, True)
+        P[up, PLAYERtwoSoft[ii - 1] - 1] = R[twoSoft[ii - 12]]
+        if ii >= 13:
+            P[up, PLAYERsoft[ii - 1] - 1] = R[soft[ii - 12]]
 
     # --- Set pair transitions ---
+    pair = moves(PAIR, totalMoves + (SP,), 'pair', True)
     for ii in range(2, 12):
-        if ii == 11:
-            pTot  = 12
-            pSoft = True
-        else:
-            pTot  = 2 * ii
-            pSoft = False
-        from_idx = PLAYERpair[ii - 1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move  = PAIR[ii - 2, dCard - 2]
-            if move == SR and not SRA:
-                move = H
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[pTot - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == SP:
-                to_idx = PLAYERsplit[ii - 1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = pTot + pNew
-                    new_soft = pSoft or (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft  = (pSoft and (pNew == 11))
-                    prob = deck[pNew - 1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot - 1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = pTot + pNew
-                    new_soft = pSoft or (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft  = (pSoft and (pNew == 11))
-                    prob = deck[pNew - 1]
-                    if new_tot > 21:
-                        to_idx = PLAYERdoubBust - 1
-                    else:
-                        to_idx = PLAYERdoubStand[new_tot - 1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in pair")
-
-    # --- Compute Pinf (absorbing probabilities) ---
-    Pinf.fill(0)
-    for ii in range(2, 12):
-        d_idx = ii - 1
-        Pinf[d_idx, :, :] = matrix_power(P[d_idx, :, :], 21)
-
-
+        R = rows(12, True, ii) if ii == 11 else rows(2 * ii, False, ii)
+        P[up, PLAYERpair[ii - 1] - 1] = R[pair[ii - 2]]
 
-    
-    '''num_states = PLAYERdoubBust # 122
-    labels = [''] * num_states
 
-    # first2…first11
-    for i in range(2, 12):
-        idx = PLAYERfirst[i - 1] - 1
-        labels[idx] = f"first{i}"
-    # twoHard4…twoHard21
-    for i in range(4, 22):
-        idx = PLAYERtwoHard[i - 1] - 1
-        labels[idx] = f"twoHard{i}"
-    # twoSoft12…twoSoft21
-    for i in range(12, 22):
-        idx = PLAYERtwoSoft[i - 1] - 1
-        labels[idx] = f"twoSoft{i}"
-    # pair2…pair11
-    for i in range(2, 12):
-        idx = PLAYERpair[i - 1] - 1
-        labels[idx] = f"pair{i}"
-    # hard5…hard21
-    for i in range(5, 22):
-        idx = PLAYERhard[i - 1] - 1
-        labels[idx] = f"hard{i}"
-    # soft13…soft21
-    for i in range(13, 22):
-        idx = PLAYERsoft[i - 1] - 1
-        labels[idx] = f"soft{i}"
-    # stand4…stand21
-    for i in range(4, 22):
-        idx = PLAYERstand[i - 1] - 1
-        labels[idx] = f"stand{i}"
-    # doubStand6…doubStand21
-    for i in range(6, 22):
-        idx = PLAYERdoubStand[i - 1] - 1
-        labels[idx] = f"doubStand{i}"
-    # split2…split11
-    for i in range(2, 12):
-        idx = PLAYERsplit[i - 1] - 1
-        labels[idx] = f"split{i}"
-    # bj, surrender, bust, doubBust
-    labels[PLAYERbj        - 1] = 'bj'
-    labels[PLAYERsurrender - 1] = 'surrender'
-    labels[PLAYERbust      - 1] = 'bust'
-    labels[PLAYERdoubBust  - 1] = 'doubBust'
-
-
-    dealer_card = 2
-    d_idx = dealer_card - 1
-
-    fig, ax = plt.subplots(figsize=(10, 10))
-    cax = ax.imshow(P[d_idx, :, :], cmap='jet', interpolation='nearest', vmin=0, vmax=1)
-    fig.colorbar(cax, ax=ax, shrink=0.75, label='')
-
-    ax.set_xticks(np.arange(num_states))
-    ax.set_yticks(np.arange(num_states))
-    ax.set_xticklabels(labels, rotation=90, fontsize=5)
-    ax.set_yticklabels(labels, fontsize=5)
-
-    ax.xaxis.tick_top()
-    ax.tick_params(axis='x', labeltop=True, labelbottom=False)
-
-    plt.tight_layout()
-    plt.show()
-
-
-
-setup_variables.setup_variables()
-strategy = set_strategy.set_strategy('basic')
-
-calc_player_trans(np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 4, 1], dtype=float) / 13, strategy)'''
\ No newline at end of file
+def hit_total(tot, soft, pNew):
+    """
+    Total and softness (an ace counted as 11) after drawing pNew (2..11) to
+    a hand of total tot; totals above 21 are busts.
+    """
+    new_tot  = tot + pNew
+    new_soft = soft or (pNew == 11)
+    if new_tot > 21 and new_soft:
+        new_tot  -= 10
+        new_soft  = soft and (pNew == 11)
+        if new_tot > 21 and new_soft:
+            new_tot  -= 10
+            new_soft  = False
+    return new_tot, new_soft
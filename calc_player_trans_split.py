@@ -1,387 +1,308 @@
 import numpy as np
-from numpy.linalg import matrix_power
+from types import SimpleNamespace
 import setup_variables
-import matplotlib.pyplot as plt
-import set_strategy
+import stage_profile
+from absorb_chain import absorb_chain, absorb_vectors
+from sparse_trans import absorb_rows_csr, absorb_vectors_csr
+from compile_topology import cached_topology, rules_key, strategy_key, fill_trans, topology_csr
+from calc_player_trans import build_player_trans, compile_player_trans
 
-def calc_player_trans_split(deck, strategy):
+def calc_player_trans_split(deck, strategy, full=True, sparse=False):
     """
     Given the deck pdf and a strategy namespace (with PAIR, HARD, SOFT arrays),
     computes the start‐finish transition matrices for a post‐split player's hand.
-    Populates setup_variables.P and setup_variables.PSinf in place.
+    Populates setup_variables.PSinf in place; the split chain itself is
+    built in a local array and setup_variables.P is left alone.
+    With full=False the split chain is not built at all: the main chain
+    (calc_player_trans) is built into setup_variables.P and the first-card
+    rows of Pinf and the split_rows() of PSinf are absorbed through it in
+    one pass (see absorb_player_rows), which is all adv_single_hand reads.
+    With sparse=True the chains are built and absorbed in CSR form, the
+    main chain stored in setup_variables.Pcsr instead of the dense P.
+    """
+    PSinf = setup_variables.PSinf  # shape: (11, 122, 122)
+    n     = setup_variables.numPlayerStates
+
+    PLAYERlevels = setup_variables.PLAYERlevels
+
+    if not full:
+        _calc_player_rows(deck, strategy, sparse)
+        return
+
+    with stage_profile.stage('build_PS'):
+        topo = compile_player_trans_split(strategy)
+        PS = topology_csr(topo, deck) if sparse else fill_trans(topo, deck)
+
+    # --- Compute PSinf (absorbing probabilities) ---
+    with stage_profile.stage('absorb_PS'):
+        PSinf.fill(0)
+        if sparse:
+            PSinf[1:] = absorb_rows_csr(PS, PLAYERlevels, np.arange(1, n + 1))[1:]
+        else:
+            absorb_chain(PS[1:], PLAYERlevels, setup_variables.PLAYERabsorbing, PSinf[1:])
+
+
+def _calc_player_rows(deck, strategy, sparse):
+    # The full=False case of calc_player_trans_split
+    Pinf  = setup_variables.Pinf
+    PSinf = setup_variables.PSinf
+    first = setup_variables.PLAYERfirst[1:]
+    rows  = split_rows()
+
+    with stage_profile.stage('build_P'):
+        topo = compile_player_trans(strategy)
+        if sparse:
+            setup_variables.Pcsr = topology_csr(topo, deck)
+        else:
+            fill_trans(topo, deck, setup_variables.P)
+    with stage_profile.stage('build_PS'):
+        start = fill_trans(compile_split_start(strategy), deck)
+
+    with stage_profile.stage('absorb_P'):
+        if sparse:
+            V = np.zeros((11, 10 + len(rows), setup_variables.numPlayerStates))
+            player_start_rows(start, V[1:])
+            V = absorb_vectors_csr(setup_variables.Pcsr, setup_variables.PLAYERlevels, V)[1:]
+        else:
+            V = absorb_player_rows(setup_variables.P[1:], start)
+        Pinf.fill(0)
+        PSinf.fill(0)
+        Pinf[1:, first - 1, :]  = V[:, :10]
+        PSinf[1:, rows - 1, :] = V[:, 10:]
+
+
+def compile_player_trans_split(strategy, houseRules=None):
+    """
+    Compiled topology of the post-split player's transitions for the strategy and the
+    house rules (default: setup_variables.houseRules), see
+    compile_topology.compile_topology.  Cached per table.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    n = setup_variables.numPlayerStates
+    key = ('split', rules_key(houseRules), strategy_key(strategy))
+    return cached_topology(key, lambda deck, T: build_player_trans_split(deck, strategy, T, houseRules), (11, n, n))
+
+
+def split_rows(houseRules=None):
+    """
+    State names of the PSinf rows the evaluators read: the first-card rows,
+    followed with houseRules.MSA by the pair rows (see split_profit).
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    rows = setup_variables.PLAYERfirst[1:]
+    if houseRules.MSA:
+        rows = np.concatenate([rows, setup_variables.PLAYERpair[1:]])
+    return rows
+
+
+def resplit_probs(deck, strategy, houseRules=None):
+    """
+    With houseRules.MSA, a namespace with the most hands a pair may be split
+    into (hands, houseRules.MSH) and prob (..., 10, 10): for a deck, or a
+    stack of decks of shape (..., 11), the probability that a post-split hand
+    on up-card 2..11 (axis -2) starting from card 2..11 (axis -1) is dealt a
+    pair the strategy splits again.  Split aces resplit only with HASAA.
+    None without MSA.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    if not houseRules.MSA:
+        return None
+
+    resplit = (strategy.PAIR == setup_variables.playerMoves.SP).T   # [up-card, pair card]
+    if not houseRules.HASAA:
+        resplit = resplit.copy()
+        resplit[:, -1] = False
+
+    deck = np.asarray(deck, dtype=float)
+    return SimpleNamespace(prob=resplit * deck[..., None, 1:], hands=houseRules.MSH)
+
+
+def split_profit(single, pair, resplit=None):
+    """
+    Expected profit of splitting a pair, over all the hands it turns into.
+    single is the profit of one post-split hand played without resplitting
+    (from its PSinf first-card row), pair that of its pair state, and
+    resplit as returned by resplit_probs (None: the two hands are final).
+    With p = resplit.prob and a = single - p * pair, the profit of a hand
+    that does not resplit, n hands still to play with r resplits left are
+    worth G(n, r) = a + (1 - p) G(n-1, r) + p G(n+1, r-1), and G(n, 0) =
+    n single.  Memoized on (n, r); returns G(2, resplit.hands - 2).
+    """
+    if resplit is None:
+        return 2.0 * single
+    p = resplit.prob
+    a = single - p * pair
+    memo = {}
+
+    def G(n, r):
+        if n == 0:
+            return 0.0
+        if r == 0:
+            return n * single
+        if (n, r) not in memo:
+            memo[n, r] = a + (1 - p) * G(n - 1, r) + p * G(n + 1, r - 1)
+        return memo[n, r]
+
+    return G(2, resplit.hands - 2)
+
+
+def compile_split_start(strategy, houseRules=None):
+    """
+    Compiled topology (see compile_topology.compile_topology) of the
+    post-split hands' start distributions, shape (10, len(split_rows()), 122):
+    for each up-card 2..11 and row of split_rows, the states of the player's
+    main chain (calc_player_trans) a post-split hand continues from, after
+    its second card (see split_redirect).  Absorbing them in the main chain,
+    as absorb_chain.absorb_vectors does, gives those rows of PSinf without
+    building or absorbing the split chain.  Cached per table.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    shape = (10, len(split_rows(houseRules)), setup_variables.numPlayerStates)
+    key = ('split start', rules_key(houseRules), strategy_key(strategy))
+    return cached_topology(key, lambda deck, V: build_split_start(deck, strategy, V, houseRules), shape)
+
+
+def absorb_player_rows(P, start, V=None, visits=None):
+    """
+    The first-card rows of Pinf and the split_rows of PSinf in one pass
+    through the main chain: P holds the main chain's slices for up-cards
+    2..11 (shape (..., 10, 122, 122)) and start the post-split start
+    distributions (shape (..., 10, m, 122), see compile_split_start).
+    Fills V (shape (..., 10, 10 + m, 122)) if given, and returns it, the
+    first-card rows first.  visits as in absorb_chain.absorb_vectors.
+    """
+    return absorb_vectors(P, setup_variables.PLAYERlevels, player_start_rows(start, V), visits)
+
+
+def player_start_rows(start, V=None):
+    """
+    The start distributions absorb_player_rows pushes through the main
+    chain: a unit row per first card, then start.  Fills V if given, and returns it.
+    """
+    first = setup_variables.PLAYERfirst[1:]
+    if V is None:
+        V = np.zeros(start.shape[:-2] + (10 + start.shape[-2], start.shape[-1]), dtype=float)
+    V[..., :10, :] = 0
+    V[..., np.arange(10), first - 1] = 1
+    V[..., 10:, :] = start
+    return V
+
+
+def split_redirect(strategy, houseRules=None):
+    """
+    The post-split chain differs from the main chain only in a few rows.
+    Returns, per dealer up-card slice of P, the state (0-based) whose row
+    of the main chain each state's row of the post-split chain equals:
+    itself, except for two-card hands whose double DASA forbids (played
+    as a hit, i.e. the hard or soft row, or as a stand) and for pairs the
+    strategy splits (played by their total, the two-card row).
+    First-card rows are not covered.  Shape (11, 122).
     """
-    PLAYERfirst      = setup_variables.PLAYERfirst
     PLAYERtwoHard    = setup_variables.PLAYERtwoHard
     PLAYERhard       = setup_variables.PLAYERhard
     PLAYERtwoSoft    = setup_variables.PLAYERtwoSoft
     PLAYERsoft       = setup_variables.PLAYERsoft
     PLAYERpair       = setup_variables.PLAYERpair
     PLAYERstand      = setup_variables.PLAYERstand
-    PLAYERdoubStand  = setup_variables.PLAYERdoubStand
-    PLAYERsplit      = setup_variables.PLAYERsplit
-    PLAYERbj         = setup_variables.PLAYERbj
-    PLAYERsurrender  = setup_variables.PLAYERsurrender
-    PLAYERbust       = setup_variables.PLAYERbust
-    PLAYERdoubBust   = setup_variables.PLAYERdoubBust
-
-    houseRules  = setup_variables.houseRules
-    playerMoves = setup_variables.playerMoves
-
-    P     = setup_variables.P      # shape: (11, 122, 122)
-    PSinf = setup_variables.PSinf  # shape: (11, 122, 122)
 
-    HASAA = houseRules.HASAA
-    SRA   = houseRules.SRA
-    DASA  = houseRules.DASA
-    MSA   = houseRules.MSA
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    playerMoves = setup_variables.playerMoves
 
-    SR = playerMoves.SR
-    S  = playerMoves.S
-    H  = playerMoves.H
     DB = playerMoves.DB
     DS = playerMoves.DS
-    SP = playerMoves.SP
 
-    # Strategy tables
-    PAIR = strategy.PAIR
-    HARD = strategy.HARD
-    SOFT = strategy.SOFT
+    redirect = np.tile(np.arange(setup_variables.numPlayerStates), (11, 1))
+    up = np.arange(1, 11)[:, None]   # dealer up-card slices 2..11
+
+    if not houseRules.DASA:
+        # Two-card hands of a pair start from 5 hard and 13 soft up
+        for table, two, later, low, first in ((strategy.HARD, PLAYERtwoHard, PLAYERhard, 4, 5),
+                                             (strategy.SOFT, PLAYERtwoSoft, PLAYERsoft, 12, 13)):
+            tots = np.arange(first, 22)
+            move = table[tots - low].T                     # shape: (10, totals)
+            to = np.where(move == DB, later[tots - 1], PLAYERstand[tots - 1]) - 1
+            keep = ~np.isin(move, (DB, DS))
+            redirect[up, two[tots - 1] - 1] = np.where(keep, two[tots - 1] - 1, to)
 
-    P.fill(0)
+    # Split pairs play their total, as the two-card hand of that total
+    ii = np.arange(2, 12)
+    pairs = PLAYERpair[ii - 1] - 1
+    twoCard = np.append(PLAYERtwoHard[2 * ii[:-1] - 1], PLAYERtwoSoft[11]) - 1   # A,A is soft 12
+    redirect[up, pairs] = np.where(strategy.PAIR.T == playerMoves.SP, twoCard, pairs)
+    return redirect
 
-    # --- Set absorbing states ---
-    for ii in range(4, 22):
-        P[:, PLAYERstand[ii - 1] - 1, PLAYERstand[ii - 1] - 1] = 1
 
-    for ii in range(6, 22):
-        P[:, PLAYERdoubStand[ii - 1] - 1, PLAYERdoubStand[ii - 1] - 1] = 1
+def build_split_start(deck, strategy, V, houseRules=None):
+    """
+    Fills V (shape (10, len(split_rows()), 122)) with the post-split hands'
+    start distributions for the deck pdf, see compile_split_start.
+    """
+    PLAYERpair = setup_variables.PLAYERpair
+
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    redirect = split_redirect(strategy, houseRules)[1:]
+    up = np.arange(10)
 
+    V.fill(0)
     for ii in range(2, 12):
-        P[:, PLAYERsplit[ii - 1] - 1, PLAYERsplit[ii - 1] - 1] = 1
+        for pNew in range(2, 12):
+            to_idx = _split_first(ii, pNew, houseRules.HASAA) - 1
+            V[up, ii-2, redirect[:, to_idx]] += deck[pNew-1]
+        if houseRules.MSA:
+            V[up, 10 + ii-2, redirect[:, PLAYERpair[ii-1] - 1]] = 1
 
 
-    # Blackjack, surrender, bust, double-bust absorbing states
-    P[:, PLAYERbj - 1, PLAYERbj - 1] = 1
-    P[:, PLAYERsurrender - 1, PLAYERsurrender - 1] = 1
-    P[:, PLAYERbust - 1, PLAYERbust - 1] = 1
-    P[:, PLAYERdoubBust - 1, PLAYERdoubBust - 1] = 1
+def build_player_trans_split(deck, strategy, P, houseRules=None):
+    """
+    Fills P (shape (11, 122, 122)) with the post-split player's transition
+    matrices for the given deck pdf and strategy, one slice per dealer up-card:
+    the main chain of build_player_trans with the rows of split_redirect and
+    the first-card rows of a hand started from one card of a pair.
+    Run once per table by compile_player_trans_split; calls then scatter into its topology.
+    houseRules defaults to setup_variables.houseRules.
+    """
+    PLAYERfirst = setup_variables.PLAYERfirst
+
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
 
+    build_player_trans(deck, strategy, P, houseRules)
+    P[...] = P[np.arange(11)[:, None], split_redirect(strategy, houseRules)]
 
     # --- Set first-card transitions (split/pair context) ---
     for ii in range(2, 12):
         from_idx = PLAYERfirst[ii-1] - 1
+        P[:, from_idx, :] = 0
         for pNew in range(2, 12):
-            prob = deck[pNew-1]
-            # If split aces and no hit allowed
-            if ii == 11 and not HASAA:
-                new_tot = ii + pNew
-                if new_tot > 21:
-                    new_tot -= 10
-                to_idx = PLAYERstand[new_tot-1] - 1
-            elif ii != pNew:
-                # hit allowed, no pair
-                new_tot  = ii + pNew
-                new_soft = (ii == 11 or pNew == 11)
-                if new_tot > 21 and new_soft:
-                    new_tot  -= 10
-                    new_soft  = (ii == 11 and pNew == 11)
-                if new_soft:
-                    to_idx = PLAYERtwoSoft[new_tot-1] - 1
-                else:
-                    to_idx = PLAYERtwoHard[new_tot-1] - 1
-            else:
-                # start with pair
-                to_idx = PLAYERpair[ii-1] - 1
+            to_idx = _split_first(ii, pNew, houseRules.HASAA) - 1
             # apply for all dealer up-cards
-            P[:, from_idx, to_idx] += prob
-
-    # --- Set twoHard transitions ---
-    for ii in range(4, 22):
-        from_idx = PLAYERtwoHard[ii-1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = HARD[ii-4, dCard-2]
-            # apply rule overrides
-            if move == SR and not SRA:
-                move = H
-            elif move == DB and not DASA:
-                move = H
-            elif move == DS and not DASA:
-                move = S
-            # execute move
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[ii-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew-1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot-1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew-1]
-                    if new_tot > 21:
-                        to_idx = PLAYERdoubBust - 1
-                    else:
-                        to_idx = PLAYERdoubStand[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in twoHard")
-
-    # --- Set hard transitions ---
-    for ii in range(5, 22):
-        from_idx = PLAYERhard[ii-1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = HARD[ii-4, dCard-2]
-            if move == SR or move == DB:
-                move = H
-            elif move == DS:
-                move = S
-            if move == S:
-                to_idx = PLAYERstand[ii-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft = False
-                    prob = deck[pNew-1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot-1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in hard")
-
-    # --- Set twoSoft transitions ---
-    for ii in range(12, 22):
-        from_idx = PLAYERtwoSoft[ii-1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = SOFT[ii-12, dCard-2]
-            if move == SR and not SRA:
-                move = H
-            elif move == DB and not DASA:
-                move = H
-            elif move == DS and not DASA:
-                move = S
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[ii-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew-1]
-                    to_idx = (PLAYERsoft[new_tot-1] - 1) if new_soft else (PLAYERhard[new_tot-1] - 1)
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew-1]
-                    to_idx = PLAYERdoubStand[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in twoSoft")
-
-    # --- Set soft transitions ---
-    for ii in range(13, 22):
-        from_idx = PLAYERsoft[ii-1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = SOFT[ii-12, dCard-2]
-            if move == SR or move == DB:
-                move = H
-            elif move == DS:
-                move = S
-            if move == S:
-                to_idx = PLAYERstand[ii-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = ii + pNew
-                    new_soft = True
-                    if new_tot > 21:
-                        new_tot  -= 10
-                        new_soft  = (pNew == 11)
-                    prob = deck[pNew-1]
-                    to_idx = (PLAYERsoft[new_tot-1] - 1) if new_soft else (PLAYERhard[new_tot-1] - 1)
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in soft")
-
-    # --- Set pair transitions ---
-    for ii in range(2, 12):
-        if ii == 11:
-            pTot  = 12
-            pSoft = True
-        else:
-            pTot  = 2 * ii
-            pSoft = False
-        from_idx = PLAYERpair[ii-1] - 1
-        for dCard in range(2, 12):
-            d_idx = dCard - 1
-            move = PAIR[ii-2, dCard-2]
-            # prevent re-splitting if not allowed
-            if move == SP and not MSA:
-                if pSoft:
-                    move = SOFT[pTot-12, dCard-2]
-                else:
-                    move = HARD[pTot-4, dCard-2]
-            if move == SR and not SRA:
-                move = H
-            if move == SR:
-                to_idx = PLAYERsurrender - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == S:
-                to_idx = PLAYERstand[pTot-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == SP:
-                to_idx = PLAYERsplit[ii-1] - 1
-                P[d_idx, from_idx, to_idx] = 1.0
-            elif move == H:
-                for pNew in range(2, 12):
-                    new_tot  = pTot + pNew
-                    new_soft = pSoft or (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft  = (pSoft and (pNew == 11))
-                    prob = deck[pNew-1]
-                    if new_tot > 21:
-                        to_idx = PLAYERbust - 1
-                    elif new_soft:
-                        to_idx = PLAYERsoft[new_tot-1] - 1
-                    else:
-                        to_idx = PLAYERhard[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            elif move in (DB, DS):
-                for pNew in range(2, 12):
-                    new_tot  = pTot + pNew
-                    new_soft = pSoft or (pNew == 11)
-                    if new_tot > 21 and new_soft:
-                        new_tot  -= 10
-                        new_soft  = (pSoft and (pNew == 11))
-                    prob = deck[pNew-1]
-                    if new_tot > 21:
-                        to_idx = PLAYERdoubBust - 1
-                    else:
-                        to_idx = PLAYERdoubStand[new_tot-1] - 1
-                    P[d_idx, from_idx, to_idx] += prob
-            else:
-                raise ValueError(f"Unknown move {move} in pair")
+            P[:, from_idx, to_idx] += deck[pNew-1]
 
-    # --- Compute PSinf (absorbing probabilities) ---
-    PSinf.fill(0)
-    for ii in range(2, 12):
-        d_idx = ii - 1
-        PSinf[d_idx, :, :] = matrix_power(P[d_idx, :, :], 21)
-
-
-
-
-    '''num_states = PLAYERdoubBust # 122
-    labels = [''] * num_states
-
-    # first2…first11
-    for i in range(2, 12):
-        idx = PLAYERfirst[i - 1] - 1
-        labels[idx] = f"first{i}"
-    # twoHard4…twoHard21
-    for i in range(4, 22):
-        idx = PLAYERtwoHard[i - 1] - 1
-        labels[idx] = f"twoHard{i}"
-    # twoSoft12…twoSoft21
-    for i in range(12, 22):
-        idx = PLAYERtwoSoft[i - 1] - 1
-        labels[idx] = f"twoSoft{i}"
-    # pair2…pair11
-    for i in range(2, 12):
-        idx = PLAYERpair[i - 1] - 1
-        labels[idx] = f"pair{i}"
-    # hard5…hard21
-    for i in range(5, 22):
-        idx = PLAYERhard[i - 1] - 1
-        labels[idx] = f"hard{i}"
-    # soft13…soft21
-    for i in range(13, 22):
-        idx = PLAYERsoft[i - 1] - 1
-        labels[idx] = f"soft{i}"
-    # stand4…stand21
-    for i in range(4, 22):
-        idx = PLAYERstand[i - 1] - 1
-        labels[idx] = f"stand{i}"
-    # doubStand6…doubStand21
-    for i in range(6, 22):
-        idx = PLAYERdoubStand[i - 1] - 1
-        labels[idx] = f"doubStand{i}"
-    # split2…split11
-    for i in range(2, 12):
-        idx = PLAYERsplit[i - 1] - 1
-        labels[idx] = f"split{i}"
-    # bj, surrender, bust, doubBust
-    labels[PLAYERbj        - 1] = 'bj'
-    labels[PLAYERsurrender - 1] = 'surrender'
-    labels[PLAYERbust      - 1] = 'bust'
-    labels[PLAYERdoubBust  - 1] = 'doubBust'
-
-
-
-    dealer_card = 2
-    d_idx = dealer_card - 1  
-
-    fig, ax = plt.subplots(figsize=(10, 10))
-    cax = ax.imshow(PSinf[d_idx, :, :], cmap='jet', interpolation='nearest', vmin=0, vmax=1)
-    fig.colorbar(cax, ax=ax, shrink=0.75, label='')
-
-    ax.set_xticks(np.arange(num_states))
-    ax.set_yticks(np.arange(num_states))
-    ax.set_xticklabels(labels, rotation=90, fontsize=5)
-    ax.set_yticklabels(labels, fontsize=5)
-
-    ax.xaxis.tick_top()
-    ax.tick_params(axis='x', labeltop=True, labelbottom=False)
-
-    plt.tight_layout()
-    plt.show()
-
-
-
-
-setup_variables.setup_variables()
-strategy = set_strategy.set_strategy('basic')
-
-calc_player_trans_split(np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 4, 1], dtype=float) / 13, strategy)'''
\ No newline at end of file
+
+def _split_first(ii, pNew, HASAA):
+    """
+    State name a hand started from one card ii of a split pair moves to on
+    drawing pNew: a pair again, a two-card total, or, for split aces that
+    may not be hit, straight to standing.
+    """
+    if ii == 11 and not HASAA:
+        new_tot = ii + pNew
+        if new_tot > 21:
+            new_tot -= 10
+        return setup_variables.PLAYERstand[new_tot-1]
+    if ii == pNew:
+        return setup_variables.PLAYERpair[ii-1]
+    new_tot  = ii + pNew
+    new_soft = (ii == 11 or pNew == 11)
+    if new_tot > 21 and new_soft:
+        new_tot  -= 10
+        new_soft  = (ii == 11 and pNew == 11)
+    if new_soft:
+        return setup_variables.PLAYERtwoSoft[new_tot-1]
+    return setup_variables.PLAYERtwoHard[new_tot-1]
@@ -0,0 +1,141 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from types import SimpleNamespace
+from sparse_trans import csr_pattern, csr_with_data
+
+# Compiled topologies, keyed by strategy tables and house rules
+_cache = OrderedDict()
+_cacheSize = 64
+_cacheLock = threading.Lock()
+
+def cached_topology(key, build, shape):
+    """
+    compile_topology(build, shape), reusing the result last compiled under key
+    (see rules_key and strategy_key), so the build loops run once per table.
+    """
+    with _cacheLock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        topo = compile_topology(build, shape)
+        _cache[key] = topo
+        if len(_cache) > _cacheSize:
+            _cache.popitem(last=False)
+        return topo
+
+
+def rules_key(houseRules):
+    """
+    Cache key for the house rules: the flags and the split limit MSH.
+    """
+    return (houseRules.DSSS, houseRules.DASA, houseRules.MSA, houseRules.MSH, houseRules.HASAA, houseRules.SRA)
+
+
+def strategy_key(strategy):
+    """
+    Cache key for the strategy tables (PAIR, HARD, SOFT).
+    """
+    return (strategy.PAIR.tobytes(), strategy.HARD.tobytes(), strategy.SOFT.tobytes())
+
+
+def compile_topology(build, shape):
+    """
+    Runs build(deck, T) on probe decks (see trans_basis) and returns the
+    entries of T as flat index arrays: T[dealer_idx, from_idx, to_idx] gets
+    deck[rank_idx], where rank_idx is 1..10 for cards 2..11 and -1 for an
+    entry that is always 1.  dealer_idx is all zeros for a 2-D T.
+    Also keeps the basis T0, A restricted to the nonzero positions of T
+    (support, flat indices): T.flat[support] = T0 + deck[1:] @ A.
+    """
+    T0, A = trans_basis(build, shape)
+    shape3 = shape if len(shape) == 3 else (1,) + tuple(shape)
+
+    const = np.nonzero(T0.reshape(shape3))
+    rank, *draw = np.nonzero(A.reshape((10,) + shape3))
+
+    topo = SimpleNamespace()
+    topo.shape      = tuple(shape)
+    topo.dealer_idx = np.concatenate([const[0], draw[0]])
+    topo.from_idx   = np.concatenate([const[1], draw[1]])
+    topo.to_idx     = np.concatenate([const[2], draw[2]])
+    topo.rank_idx   = np.concatenate([np.full(len(const[0]), -1), rank + 1])
+
+    topo.support = np.flatnonzero((T0 != 0) | np.any(A != 0, axis=0))
+    topo.T0      = T0.ravel()[topo.support]                 # shape: (nnz,)
+    topo.A       = A.reshape(10, -1)[:, topo.support]       # shape: (10, nnz)
+    return topo
+
+
+def trans_basis(build, shape):
+    """
+    Every transition probability is either a constant or a single deck[k], so
+    T(deck) = T0 + sum_k deck[k] * A[k-1] for k = 1..10.  Recovers T0 and the
+    (10,) + shape basis A by calling build(deck, T) on the empty and unit decks.
+    """
+    deck = np.zeros(11, dtype=float)
+    T0 = np.zeros(shape, dtype=float)
+    build(deck, T0)
+
+    A = np.zeros((10,) + shape, dtype=float)
+    for k in range(1, 11):
+        deck[:] = 0.0
+        deck[k] = 1.0
+        build(deck, A[k - 1])
+        A[k - 1] -= T0
+    return T0, A
+
+
+def basis_values(topo, deck):
+    """
+    Values of T on topo.support for a deck (11 entries, cards 2..11 at 1..10),
+    or a stack of decks of shape (..., 11): one product with the basis.
+    Returns shape (..., nnz).
+    """
+    deck = np.asarray(deck, dtype=float)
+    return topo.T0 + deck[..., 1:] @ topo.A
+
+
+def basis_gradient(topo, G):
+    """
+    Chain rule through the basis: for a function of T whose derivatives
+    with respect to the entries of T are G (shape topo.shape), its
+    derivatives with respect to deck[1:] (cards 2..11).  Returns shape (10,).
+    """
+    return topo.A @ np.reshape(G, -1)[topo.support]
+
+
+def fill_trans(topo, deck, T=None):
+    """
+    Builds the dense transition array for a deck, or a stack of decks of shape
+    (..., 11), from the basis of the compiled topology (see basis_values).
+    Fills T if given, else returns a new array of shape (...) + topo.shape.
+    """
+    vals = basis_values(topo, deck)
+    lead = vals.shape[:-1]
+    if T is not None and T.flags.c_contiguous:
+        # Scatter straight into the caller's workspace
+        T.fill(0)
+        T.reshape(lead + (-1,))[..., topo.support] = vals
+        return T
+    dense = np.zeros(lead + (int(np.prod(topo.shape)),), dtype=float)
+    dense[..., topo.support] = vals
+    dense = dense.reshape(lead + topo.shape)
+    if T is None:
+        return dense
+    T[...] = dense
+    return T
+
+
+def topology_csr(topo, deck):
+    """
+    CSR form of the transition array for a deck, or a stack of decks of shape
+    (..., 11) sharing one pattern, built straight from the compiled topology;
+    the pattern (see sparse_trans.csr_pattern) is kept on the topology.
+    """
+    if not hasattr(topo, 'csr'):
+        # The pattern is the same for every deck: sort it once per topology
+        shape3 = topo.shape if len(topo.shape) == 3 else (1,) + topo.shape
+        topo.csr = csr_pattern(shape3, *np.unravel_index(topo.support, shape3))
+    return csr_with_data(topo.csr, basis_values(topo, deck))
+
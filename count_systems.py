@@ -0,0 +1,173 @@
+import argparse
+import math
+import sys
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from set_strategy import set_strategy
+from engine import Engine
+from optimal_strategy import action_evs
+from deviation_indices import TAG_SYSTEMS, DECK, count_deck, move_class
+
+def count_report(tags, decks=6, counts=np.arange(-6, 6.5, 0.5), strategy=None, houseRules=None,
+                 decksLeft=None):
+    """
+    Evaluates a counting system (10 tags, A, 2..10) for a shoe of decks
+    decks: the advantage of strategy (default: basic strategy) at each
+    true count in counts, from the representative compositions of
+    deviation_indices.count_deck evaluated in one streamed batch, and the
+    system's betting correlation and playing efficiency (see
+    betting_correlation and playing_efficiency, the latter with decksLeft
+    decks unseen, default half the shoe).
+    Returns a namespace with tags, counts, advantage (per count), eor,
+    betting and playing.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    if strategy is None:
+        strategy = set_strategy('basic', houseRules)
+    if decksLeft is None:
+        decksLeft = decks / 2
+
+    engine = Engine(houseRules, strategy)
+    counts = np.asarray(counts, dtype=float)
+    shoes = count_deck(tags, counts, decks)
+
+    report = SimpleNamespace()
+    report.tags      = np.asarray(tags, dtype=float)
+    report.counts    = counts
+    report.advantage = np.concatenate(list(engine.advantage_stream(shoes / np.sum(shoes, axis=-1, keepdims=True))))
+    report.eor       = engine.effects_of_removal(DECK)
+    report.betting   = betting_correlation(tags, report.eor)
+    report.playing   = playing_efficiency(tags, decks, decksLeft, strategy, houseRules)
+    return report
+
+
+def betting_correlation(tags, eor):
+    """
+    Correlation of the tags with the effects of removal eor (both A, 2..10),
+    each rank weighted by its share of the deck: how well the running
+    count tracks the change in advantage.
+    """
+    return _correlation(np.asarray(tags, dtype=float), np.asarray(eor, dtype=float))
+
+
+def playing_efficiency(tags, decks=6, decksLeft=3, strategy=None, houseRules=None):
+    """
+    Share of the gain from varying the two-card plays with the exact
+    composition that a count with these tags captures.  For each cell, the
+    gap between the best other move and the strategy's move changes with
+    the cards seen by its effects of removal (one batch of action_evs on a
+    single deck and each one-card removal from it); over the compositions
+    of decksLeft decks left from decks, the gap is taken as normal with
+    that spread, and a count that predicts it with correlation rho as
+    normal with rho times the spread.  The gain is the expected positive
+    part of the predicted gap, summed over the cells weighted by how often
+    the hand is dealt.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    if strategy is None:
+        strategy = set_strategy('basic', houseRules)
+    mv = setup_variables.playerMoves
+    moves = np.array([mv.S, mv.H, mv.DB, mv.SP, mv.SR])
+    tags = np.asarray(tags, dtype=float)
+
+    EV = action_evs(np.vstack([DECK, DECK - np.eye(10)]), houseRules)
+    freq = _two_card_frequencies(DECK / np.sum(DECK))
+
+    # Spread of a share of the cards left, relative to a one-card removal from one deck
+    n = 52 * decksLeft
+    scale = (np.sum(DECK) - 1) * math.sqrt((52 * decks - n) / (n * (52 * decks - 1)))
+
+    gainCount = 0.0
+    gainFull = 0.0
+    for table in ('HARD', 'SOFT', 'PAIR'):
+        ev = getattr(EV, table)[..., moves]                           # shape: (11, rows, 10, 5)
+        base = move_class(getattr(strategy, table), houseRules)[..., None] == moves
+        valid = ~np.isnan(ev[0]) & ~base
+        other = np.argmax(np.where(valid, ev[0], -np.inf), axis=-1)[..., None]
+
+        gap = (np.take_along_axis(ev, other[None], axis=-1)[..., 0]
+               - np.sum(np.where(base, ev, 0.0), axis=-1))            # shape: (11, rows, 10)
+        eor = np.moveaxis(gap[1:] - gap[0], 0, -1)
+        spread = scale * np.sqrt(eor**2 @ (DECK / np.sum(DECK)))
+        rho = np.abs(_correlation(tags, eor))
+
+        use = (freq[table] > 0) & np.any(valid, axis=-1) & np.any(base, axis=-1)
+        f = freq[table][use]
+        gainCount += f @ _normal_gain(gap[0][use], rho[use] * spread[use])
+        gainFull  += f @ _normal_gain(gap[0][use], spread[use])
+    return gainCount / gainFull
+
+
+def _correlation(tags, eor):
+    # Correlation of tags with eor (..., 10) over the ranks, weighted by their share of the deck
+    w = DECK / np.sum(DECK)
+    t = tags - w @ tags
+    e = eor - (eor @ w)[..., None]
+    norm = np.sqrt((w @ t**2) * (e**2 @ w))
+    return np.divide((e * t) @ w, norm, out=np.zeros(np.shape(norm)), where=norm > 0)
+
+
+def _normal_gain(mean, spread):
+    # E[max(X, 0)] for X normal with the given mean and spread
+    z = np.divide(mean, spread, out=np.zeros_like(mean), where=spread > 0)
+    pdf = np.exp(-z**2 / 2) / math.sqrt(2 * math.pi)
+    cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+    return np.where(spread > 0, spread * pdf + mean * cdf, np.maximum(mean, 0.0))
+
+
+def _two_card_frequencies(probs):
+    """
+    Probability of each cell of the HARD, SOFT and PAIR tables as the
+    player's first two cards and the up-card, for rank probabilities probs
+    (A, 2..10); blackjack is no decision and is left out.
+    """
+    p = np.append(probs[1:], probs[0])                            # cards 2..11
+    freq = {'HARD': np.zeros((18, 10)), 'SOFT': np.zeros((10, 10)), 'PAIR': np.zeros((10, 10))}
+    for i in range(2, 12):
+        for j in range(2, 12):
+            hand = p[i - 2] * p[j - 2] * p
+            if i == j:
+                freq['PAIR'][i - 2] += hand
+            elif 11 in (i, j):
+                if i + j < 21:
+                    freq['SOFT'][i + j - 12] += hand
+            else:
+                freq['HARD'][i + j - 4] += hand
+    return freq
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare card-counting systems: advantage by true count, "
+                                                 "betting correlation and playing efficiency.")
+    parser.add_argument('--tags', nargs='+', default=['hilo', 'ko', 'omega2'],
+                        help=f"tag systems ({', '.join(TAG_SYSTEMS)}) or 10 comma-separated tags, A..10")
+    parser.add_argument('--decks', type=float, default=6)
+    parser.add_argument('--min', type=float, default=-6, help="lowest true count (default: -6)")
+    parser.add_argument('--max', type=float, default=6, help="highest true count (default: 6)")
+    parser.add_argument('--step', type=float, default=1, help="true count grid step (default: 1)")
+    args = parser.parse_args(argv)
+
+    setup_variables.setup_variables()
+    counts = np.arange(args.min, args.max + args.step / 2, args.step)
+
+    reports = {}
+    for name in args.tags:
+        tags = TAG_SYSTEMS[name] if name in TAG_SYSTEMS else [float(t) for t in name.split(',')]
+        reports[name] = count_report(tags, args.decks, counts)
+
+    width = max(len(name) for name in reports)
+    print(f"{'system':<{width}}   BC     PE")
+    for name, r in reports.items():
+        print(f"{name:<{width}}  {r.betting:.3f}  {r.playing:.3f}")
+    print()
+    print(f"{'TC':>6}" + ''.join(f"  {name:>{max(width, 7)}}" for name in reports))
+    for k, tc in enumerate(counts):
+        print(f"{tc:>+6.1f}" + ''.join(f"  {100 * r.advantage[k]:>+{max(width, 7)}.3f}" for r in reports.values()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from compute_term_profit import payoff_matrix
+from calc_player_trans_split import split_profit
+
+def fold_gradient(probs, pFirst, psFirst, pdRow, resplit=None):
+    """
+    Reverse pass of adv_single_hand_batch.fold_advantage: the advantage and
+    its derivatives with respect to each of its inputs, the others held
+    fixed.  Returns a namespace with advantage and probs (..., 10), pFirst,
+    psFirst and pdRow, shaped as the inputs, and prob, that of resplit.prob
+    (None without resplit).  An up-card with probability 0 still gets the
+    derivative of its profit, the profit fold_advantage zeroes.
+    """
+    PLAYERsplit = setup_variables.PLAYERsplit
+    PLAYERbj    = setup_variables.PLAYERbj
+    DEALERbj    = setup_variables.DEALERbj
+    W = payoff_matrix()
+    split = PLAYERsplit[1:] - 1
+
+    # Forward pass, as fold_profits
+    probDealerBJ = pdRow[..., DEALERbj - 1]
+    pRow = np.einsum('...k,...dks->...ds', probs, pFirst)
+    profitDealerBJ = pRow[..., PLAYERbj - 1] - 1.0
+
+    pdRowNoBJ = pdRow.copy()
+    pdRowNoBJ[..., DEALERbj - 1] = 0.0
+    norm = np.sum(pdRowNoBJ, axis=-1, keepdims=True)
+    pdRowNoBJ = np.divide(pdRowNoBJ, norm, out=np.zeros_like(pdRowNoBJ), where=norm > 0)
+
+    stateProfits = pdRowNoBJ @ W.T
+    splitRows = np.einsum('...is,...s->...i', psFirst, stateProfits)
+    single, pair = splitRows[..., :10], splitRows[..., 10:]
+    splitProfits = split_profit(single, pair, resplit)
+
+    profitNoDealerBJ = np.einsum('...s,...s->...', pRow, stateProfits)
+    profitNoDealerBJ += np.sum(pRow[..., split] * splitProfits, axis=-1)
+    dProfits = probDealerBJ * profitDealerBJ + (1.0 - probDealerBJ) * profitNoDealerBJ
+
+    # Reverse pass: derivatives of the advantage, last step first
+    gNoBJ = probs * (1.0 - probDealerBJ)
+    gRow = gNoBJ[..., None] * stateProfits
+    gRow[..., split] += gNoBJ[..., None] * splitProfits
+    gRow[..., PLAYERbj - 1] += probs * probDealerBJ
+    gState = gNoBJ[..., None] * pRow
+    gSplit = gNoBJ[..., None] * pRow[..., split]
+
+    # split_profit is linear in single and pair
+    gRows = gSplit * split_profit(1.0, 0.0, resplit)
+    if resplit is not None:
+        gRows = np.concatenate([gRows, gSplit * split_profit(0.0, 1.0, resplit)], axis=-1)
+    gState += np.einsum('...is,...i->...s', psFirst, gRows)
+
+    gNorm = gState @ W
+    gNorm -= np.sum(gNorm * pdRowNoBJ, axis=-1, keepdims=True)
+    gPd = np.divide(gNorm, norm, out=np.zeros_like(gNorm), where=norm > 0)
+    gPd[..., DEALERbj - 1] = probs * (profitDealerBJ - profitNoDealerBJ)
+
+    grad = SimpleNamespace()
+    grad.advantage = np.sum(np.where(probs > 0, dProfits, 0.0) * probs, axis=-1)
+    grad.probs   = dProfits + np.einsum('...dks,...ds->...k', pFirst, gRow)
+    grad.pFirst  = probs[..., None, :, None] * gRow[..., :, None, :]
+    grad.psFirst = gRows[..., None] * stateProfits[..., None, :]
+    grad.pdRow   = gPd
+    grad.prob    = None if resplit is None else gSplit * _split_profit_dp(single, pair, resplit)
+    return grad
+
+
+def _split_profit_dp(single, pair, resplit):
+    """
+    Derivative of calc_player_trans_split.split_profit with respect to
+    resplit.prob, through the same recursion.
+    """
+    p = resplit.prob
+    memo = {}
+
+    def GD(n, r):
+        # G(n, r) of split_profit and its derivative
+        if n == 0:
+            return 0.0, 0.0
+        if r == 0:
+            return n * single, 0.0
+        if (n, r) not in memo:
+            g1, d1 = GD(n - 1, r)
+            g2, d2 = GD(n + 1, r - 1)
+            memo[n, r] = (single - p * pair + (1 - p) * g1 + p * g2,
+                          -pair - g1 + (1 - p) * d1 + g2 + p * d2)
+        return memo[n, r]
+
+    return GD(2, resplit.hands - 2)[1]
@@ -0,0 +1,168 @@
+import argparse
+import csv
+import sys
+import numpy as np
+import setup_variables
+from set_strategy import set_strategy
+from optimal_strategy import action_evs
+
+# Card tags of common counting systems, A, 2..10
+TAG_SYSTEMS = {
+    'hilo':   [-1, 1, 1, 1, 1, 1, 0, 0, 0, -1],
+    'ko':     [-1, 1, 1, 1, 1, 1, 1, 0, 0, -1],
+    'hiopt1': [0, 0, 1, 1, 1, 1, 0, 0, 0, -1],
+    'hiopt2': [0, 1, 1, 2, 2, 1, 1, 0, 0, -2],
+    'omega2': [0, 1, 1, 2, 2, 2, 1, 0, -1, -2],
+    'zen':    [-1, 1, 1, 2, 2, 2, 1, 0, 0, -2],
+}
+DECK = np.array([4, 4, 4, 4, 4, 4, 4, 4, 4, 16], dtype=float)   # Rank counts of one deck, A, 2..10
+
+def count_deck(tags, trueCount, decks=6):
+    """
+    Rank counts (A, 2..10) of a shoe with decks decks' worth of cards left at
+    the given true count(s): the cards left are tilted by rank in proportion
+    to DECK * tags, so that the count of the cards seen beyond their share of
+    a neutral shoe is trueCount * decks.  For balanced tags that is the
+    running count; for unbalanced ones (e.g. KO) it is the running count
+    less the drift of the cards seen (DECK @ tags per deck), so true count 0
+    is the neutral shoe for every system.
+    trueCount may be an array; the result has shape trueCount.shape + (10,).
+    With the infinite-deck evaluators only the proportions matter.
+    """
+    tags = np.asarray(tags, dtype=float)
+    trueCount = np.asarray(trueCount, dtype=float)
+    tilt = trueCount[..., None] / (DECK @ tags**2)
+    counts = decks * DECK * (1 - tilt * tags)
+    if np.any(counts < 0):
+        raise ValueError("true count out of range for this tag system")
+    return counts
+
+
+def deviation_indices(tags, decks=6, counts=np.arange(-10, 10.5, 0.5), strategy=None,
+                      houseRules=None, iterations=4):
+    """
+    Finds, for every cell of the strategy tables, the true counts at which
+    the best move stops being the strategy's (default: basic strategy).
+    The EVs of all moves in all cells are evaluated for every true count in
+    counts in one batched pass (see optimal_strategy.action_evs), and each
+    crossover bracketed there is refined by regula falsi, again batched over
+    all cells per iteration.
+    Returns a list of dicts with keys table, row (hand), upcard, move,
+    deviation, index and direction: play deviation instead of move when the
+    true count is >= index (direction '+') or <= index (direction '-').
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    if strategy is None:
+        strategy = set_strategy('basic', houseRules)
+    mv = setup_variables.playerMoves
+
+    counts = np.asarray(counts, dtype=float)
+    EV = action_evs(count_deck(tags, counts, decks), houseRules)
+    i0 = int(np.argmin(np.abs(counts)))
+
+    # Bracket the crossovers on the grid
+    crossings = []
+    for table, first in (('HARD', 4), ('SOFT', 12), ('PAIR', 2)):
+        ev = getattr(EV, table)                              # shape: (T, rows, 10, 6)
+        best = move_class(getattr(EV.strategy, table), houseRules)
+        base = move_class(getattr(strategy, table), houseRules)
+        for row, up in np.ndindex(base.shape):
+            b = base[row, up]
+            path = best[:, row, up]
+            if path[i0] != b:
+                # Already off the table at count 0: where it last agreed below, and first agrees again above
+                below = np.flatnonzero(path[:i0] == b)
+                if len(below):
+                    j = below[-1]
+                    crossings.append((table, first, row, up, b, path[j + 1], '+', j, j + 1))
+                above = np.flatnonzero(path[i0:] == b)
+                if len(above):
+                    j = i0 + above[0]
+                    crossings.append((table, first, row, up, b, path[j - 1], '-', j - 1, j))
+                continue
+            above = np.flatnonzero(path[i0:] != b)
+            if len(above):
+                j = i0 + above[0]
+                crossings.append((table, first, row, up, b, path[j], '+', j - 1, j))
+            below = np.flatnonzero(path[:i0] != b)
+            if len(below):
+                j = below[-1]
+                crossings.append((table, first, row, up, b, path[j], '-', j, j + 1))
+
+    if not crossings:
+        return []
+
+    # Refine every bracket at once: EV(deviation) - EV(move) changes sign in [lo, hi]
+    lo = np.array([counts[c[7]] for c in crossings])
+    hi = np.array([counts[c[8]] for c in crossings])
+    fLo = np.array([_ev_gap(EV, c, c[7]) for c in crossings])
+    fHi = np.array([_ev_gap(EV, c, c[8]) for c in crossings])
+    for _ in range(iterations):
+        mid = np.where(fHi != fLo, lo - fLo * (hi - lo) / (fHi - fLo), (lo + hi) / 2)
+        EVmid = action_evs(count_deck(tags, mid, decks), houseRules)
+        fMid = np.array([_ev_gap(EVmid, c, k) for k, c in enumerate(crossings)])
+        left = np.sign(fMid) == np.sign(fLo)
+        lo, fLo = np.where(left, mid, lo), np.where(left, fMid, fLo)
+        hi, fHi = np.where(left, hi, mid), np.where(left, fHi, fMid)
+    index = np.where(fHi != fLo, lo - fLo * (hi - lo) / (fHi - fLo), (lo + hi) / 2)
+
+    names = {mv.S: 'S', mv.H: 'H', mv.DB: 'D', mv.SP: 'SP', mv.SR: 'SR'}
+    results = []
+    for c, idx in zip(crossings, index):
+        table, first, row, up, b, dev, direction = c[:7]
+        results.append({'table': table, 'row': row + first, 'upcard': up + 2,
+                        'move': names[b], 'deviation': names[dev],
+                        'index': float(idx), 'direction': direction})
+    return results
+
+
+def move_class(moves, houseRules):
+    """
+    Collapses the table encoding to the move made on the first two cards:
+    DS counts as DB, and SR as H without surrender.
+    """
+    mv = setup_variables.playerMoves
+    moves = np.where(moves == mv.DS, mv.DB, moves)
+    if not houseRules.SRA:
+        moves = np.where(moves == mv.SR, mv.H, moves)
+    return moves
+
+
+def _ev_gap(EV, crossing, k):
+    # EV of the deviation minus EV of the table's move, at batch entry k
+    table, first, row, up, b, dev = crossing[:6]
+    ev = getattr(EV, table)[k, row, up]
+    return ev[dev] - ev[b]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate strategy deviation indices for a counting system.")
+    parser.add_argument('--tags', default='hilo',
+                        help=f"tag system ({', '.join(TAG_SYSTEMS)}) or 10 comma-separated tags, A..10")
+    parser.add_argument('--decks', type=float, default=6)
+    parser.add_argument('--min', type=float, default=-10, help="lowest true count (default: -10)")
+    parser.add_argument('--max', type=float, default=10, help="highest true count (default: 10)")
+    parser.add_argument('--step', type=float, default=0.5, help="true count grid step (default: 0.5)")
+    parser.add_argument('--out', default=None, help="write the index table as CSV")
+    args = parser.parse_args(argv)
+
+    tags = TAG_SYSTEMS[args.tags] if args.tags in TAG_SYSTEMS else [float(t) for t in args.tags.split(',')]
+
+    setup_variables.setup_variables()
+    counts = np.arange(args.min, args.max + args.step / 2, args.step)
+    results = deviation_indices(tags, args.decks, counts)
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['table', 'row', 'upcard', 'move', 'deviation', 'index', 'direction'])
+            writer.writeheader()
+            writer.writerows(results)
+    for r in results:
+        op = '>=' if r['direction'] == '+' else '<='
+        print(f"{r['table']:<4} {r['row']:>2} vs {r['upcard']:>2}: {r['move']:<2} -> {r['deviation']:<2} at TC {op} {r['index']:+.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import copy
+import threading
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+import stage_profile
+from set_strategy import set_strategy
+from absorb_chain import absorb_rows, absorb_values
+from compile_topology import fill_trans, basis_gradient
+from calc_player_trans import compile_player_trans
+from calc_player_trans_split import compile_split_start, absorb_player_rows, split_rows, resplit_probs
+from calc_dealer_trans import compile_dealer_trans
+from adv_single_hand_batch import adv_single_hand_batch, adv_single_hand_stream, fold_advantage
+from profit_distribution import fold_distribution
+from deck_gradient import fold_gradient
+
+class Engine:
+    """
+    Evaluator for one rule set and strategy that owns its compiled topologies
+    and preallocated workspaces, instead of the module-level P/Pinf/PSinf/PD
+    buffers.  Engines with the same tables share the topologies from
+    compile_topology's module-level cache (taken under its lock): their
+    support, T0 and A are read-only once compiled, and the CSR pattern
+    (topo.csr) and its absorption plans (pattern.plans) are filled in on
+    first sparse use, each time to the same value, so a race only repeats
+    the work.  Workspaces are per engine, so several can run at once (e.g.
+    a thread pool with one engine per thread) and with different rules in
+    the same process; calls on a single engine are serialized.
+    setup_variables.setup_variables() must have been called once for the state layout.
+    """
+    def __init__(self, rules=None, strategy=None):
+        if rules is None:
+            rules = setup_variables.houseRules
+        self.rules = copy.copy(rules)
+
+        if strategy is None:
+            strategy = set_strategy('basic', self.rules)
+        self.strategy = strategy
+
+        self.topoP     = compile_player_trans(strategy, self.rules)
+        self.topoStart = compile_split_start(strategy, self.rules)
+        self.topoPD    = compile_dealer_trans(self.rules)
+        self.splitRows = split_rows(self.rules)
+
+        nP = setup_variables.numPlayerStates
+        nD = setup_variables.numDealerStates
+
+        # Workspaces, reused by every call
+        self.P       = np.zeros((11, nP, nP))   # Player's hand
+        self.start   = np.zeros((10, len(self.splitRows), nP))   # Post-split start distributions
+        self.PD      = np.zeros((nD, nD))       # Dealer's hand
+        self.V       = np.zeros((10, 10 + len(self.splitRows), nP))
+        self.pFirst  = self.V[:, :10]           # First-card rows of Pinf, per up-card
+        self.psFirst = self.V[:, 10:]           # split_rows of PSinf, per up-card
+        self.pdRow   = np.zeros((10, nD))       # First-card rows of PDinf
+        self.visits   = np.zeros(self.V.shape)  # Mass through each state, for gradient
+        self.pdVisits = np.zeros(self.pdRow.shape)
+        self._lock   = threading.Lock()
+
+    def advantage(self, deck):
+        """
+        Player's advantage per hand for one deck distribution (10 entries),
+        as adv_single_hand but with this engine's rules, strategy and workspaces.
+        """
+        deck = np.array(deck, dtype=float)
+        deck = np.append(deck, deck[0])
+
+        with self._lock:
+            self._absorb(deck)
+            with stage_profile.stage('term_profit'):
+                resplit = resplit_probs(deck, self.strategy, self.rules)
+                return float(fold_advantage(deck[1:], self.pFirst, self.psFirst, self.pdRow, resplit))
+
+    def distribution(self, deck):
+        """
+        Distribution of the player's profit per hand for one deck distribution,
+        per up-card and overall, with its mean and variance, from the same
+        absorbed rows as advantage (see profit_distribution.fold_distribution).
+        """
+        deck = np.array(deck, dtype=float)
+        deck = np.append(deck, deck[0])
+
+        with self._lock:
+            self._absorb(deck)
+            with stage_profile.stage('term_profit'):
+                resplit = resplit_probs(deck, self.strategy, self.rules)
+                return fold_distribution(deck[1:], self.pFirst, self.psFirst, self.pdRow, resplit)
+
+    def gradient(self, deck):
+        """
+        Player's advantage for one deck distribution and its gradient with
+        respect to the deck's 10 entries (A, 2..10), each moved on its own
+        (the deck is not renormalized), from one absorption and one sweep
+        back through the chains: a namespace with advantage and gradient.
+        Every transition probability is a constant or one deck entry (see
+        compile_topology.trans_basis), so the derivatives with respect to
+        the transitions, the mass through a state times the expected profit
+        of where it leads (see absorb_chain.absorb_values), fold into the
+        deck's through the basis A.
+        """
+        deck = np.array(deck, dtype=float)
+        deck = np.append(deck, deck[0])
+
+        with self._lock:
+            self._absorb(deck, visits=True)
+            resplit = resplit_probs(deck, self.strategy, self.rules)
+            g = fold_gradient(deck[1:], self.pFirst, self.psFirst, self.pdRow, resplit)
+
+            # Expected profit of every state, per absorbed row
+            U = absorb_values(self.P[1:], setup_variables.PLAYERlevels,
+                              np.concatenate([g.pFirst, g.psFirst], axis=-2))
+            UD = absorb_values(self.PD, setup_variables.DEALERlevels, g.pdRow)
+
+            G = np.zeros(self.P.shape)
+            G[1:] = np.swapaxes(self.visits, -1, -2) @ U
+            cards = (g.probs + basis_gradient(self.topoP, G)
+                     + basis_gradient(self.topoStart, U[:, 10:])
+                     + basis_gradient(self.topoPD, self.pdVisits.T @ UD))
+            if resplit is not None:
+                # resplit.prob is linear in the deck, with the coefficients of a deck of ones
+                cards += np.sum(g.prob * resplit_probs(np.ones(11), self.strategy, self.rules).prob, axis=-2)
+
+        result = SimpleNamespace()
+        result.advantage = float(g.advantage)
+        result.gradient  = np.append(cards[-1], cards[:-1])   # A, 2..10
+        return result
+
+    def effects_of_removal(self, counts):
+        """
+        Effects of removal: the change in advantage from taking one card of
+        each rank (A, 2..10) out of a shoe with the given rank counts, to
+        first order, from one gradient at the shoe's distribution.
+        """
+        counts = np.array(counts, dtype=float)
+        total = np.sum(counts)
+        if total <= 1:
+            raise ValueError("counts must hold more than one card")
+        probs = counts / total
+        grad = self.gradient(probs).gradient
+        # Removing a card of rank j moves the distribution by (probs - e_j) / (total - 1)
+        return (grad @ probs - grad) / (total - 1)
+
+    def _absorb(self, deck, visits=False):
+        # Builds the chains for deck (11 entries) and absorbs their first-card rows into the workspaces
+        with stage_profile.stage('build_P'):
+            fill_trans(self.topoP, deck, self.P)
+        with stage_profile.stage('build_PS'):
+            fill_trans(self.topoStart, deck, self.start)
+        with stage_profile.stage('build_PD'):
+            fill_trans(self.topoPD, deck, self.PD)
+        self._absorb_filled(visits)
+
+    def _absorb_filled(self, visits=False):
+        # Absorbs the first-card rows of the filled workspaces; the split rows ride along in the main chain
+        with stage_profile.stage('absorb_P'):
+            absorb_player_rows(self.P[1:], self.start, self.V, self.visits if visits else None)
+        with stage_profile.stage('absorb_PD'):
+            absorb_rows(self.PD, setup_variables.DEALERlevels, setup_variables.DEALERfirst[1:], self.pdRow,
+                        self.pdVisits if visits else None)
+
+    def advantage_batch(self, decks, sparse=False):
+        """
+        Player's advantage per hand for an (N, 10) array of deck distributions,
+        as adv_single_hand_batch with this engine's rules and strategy.
+        """
+        return adv_single_hand_batch(decks, self.strategy, sparse, self.rules)
+
+    def advantage_stream(self, decks, chunkSize=8):
+        """
+        Yields the advantages of an iterable of deck distributions chunk by
+        chunk, as adv_single_hand_stream with this engine's rules and strategy.
+        """
+        return adv_single_hand_stream(decks, self.strategy, chunkSize, self.rules)
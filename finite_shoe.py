@@ -0,0 +1,315 @@
+import copy
+import threading
+import numpy as np
+from collections import OrderedDict
+from types import SimpleNamespace
+import setup_variables
+from set_strategy import set_strategy
+from compute_term_profit import payoff_matrix
+from calc_player_trans import compile_player_trans
+from calc_player_trans_split import compile_player_trans_split
+from calc_dealer_trans import compile_dealer_trans
+
+_BITS = 16  # Bits per rank in a packed composition key (counts up to 65535)
+
+class FiniteShoe:
+    """
+    Exact evaluator of the player's advantage for a hand dealt from a finite
+    shoe, given as integer counts of A, 2..10.  Every card drawn by the player
+    or the dealer is removed from the shoe, so each draw depends on the cards
+    already seen.  The player follows the same chains as adv_single_hand (the
+    compiled topologies for one rule set and strategy), walked card by card.
+    Subresults are memoized on the remaining composition, packed into one
+    integer, in bounded LRU caches (cacheSize entries each) kept across calls,
+    and the dealer's hands are enumerated once per up-card, grouped by the
+    cards drawn, so an exact 1-8 deck evaluation takes a few seconds.
+    The hands' play and the dealer's each look only at their own cards, so
+    the order they are dealt in does not change the result.  The two hands
+    of a split are then exchangeable: the first is played on the shoe left
+    after the pair is dealt, settled against the dealer drawing after it,
+    and its profit doubled, which is exact.  With rules.MSA a hand dealt
+    the pair card again splits again (as the strategy's PAIR table says,
+    aces only with HASAA) up to rules.MSH hands, see _split; a one-deck
+    evaluation then takes about half a minute.
+    setup_variables.setup_variables() must have been called once for the state layout.
+    """
+    def __init__(self, rules=None, strategy=None, cacheSize=2**20):
+        if rules is None:
+            rules = setup_variables.houseRules
+        self.rules = copy.copy(rules)
+
+        if strategy is None:
+            strategy = set_strategy('basic', self.rules)
+        self.strategy = strategy
+        self.cacheSize = cacheSize
+
+        self.moveP  = _moves(compile_player_trans(strategy, self.rules), setup_variables.PLAYERabsorbing)
+        self.movePS = _moves(compile_player_trans_split(strategy, self.rules), setup_variables.PLAYERabsorbing)
+
+        # Profit of each player terminal state against each dealer terminal state,
+        # the dealer's blackjack being settled before the player acts
+        self.W = payoff_matrix().copy()
+        self.W[:, setup_variables.DEALERbj - 1] = 0
+
+        self.splitCard = {s - 1: i for i, s in enumerate(setup_variables.PLAYERsplit) if i > 0}
+        # resplit[d][i]: a pair of card i + 1 is split again on up-card d
+        splits = np.asarray(strategy.PAIR) == setup_variables.playerMoves.SP
+        if not self.rules.HASAA:
+            splits[-1] = False
+        self.resplit = [None] + [[None] + list(splits[:, d - 1] & bool(self.rules.MSA)) for d in range(1, 11)]
+        moveD = _moves(compile_dealer_trans(self.rules), setup_variables.DEALERabsorbing)[0]
+        self.dealerHands = [None] + [_dealer_hands(moveD, setup_variables.DEALERfirst[d] - 1) for d in range(1, 11)]
+
+        self.playerCache = OrderedDict()
+        self.dealerCache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def advantage(self, counts):
+        """
+        Player's advantage per hand for a shoe of integer rank counts (A, 2..10).
+        """
+        counts = [int(c) for c in counts]
+        if len(counts) != 10 or min(counts) < 0 or max(counts) >= 1 << _BITS:
+            raise ValueError(f"counts must be 10 rank counts in 0..{(1 << _BITS) - 1}")
+        if sum(counts) < 4:
+            raise ValueError("the shoe must hold at least 4 cards")
+
+        with self._lock:
+            return self._advantage(counts)
+
+    def _advantage(self, counts):
+        PLAYERfirst = setup_variables.PLAYERfirst
+
+        # cnt[k], k = 1..10, is the count of card k + 1 (k = 10 for the ace)
+        self.cnt = [0] + counts[1:] + counts[:1]
+        self.total = sum(counts)
+        self.key = sum(c << (_BITS * (k - 1)) for k, c in enumerate(self.cnt) if k)
+
+        playerAdvantage = 0.0
+        for d in range(1, 11):
+            if not self.cnt[d]:
+                continue
+            pUp = self._draw(d)
+
+            # Dealer's blackjack: the player loses one bet unless also holding blackjack
+            bjCard = {9: 10, 10: 9}.get(d)
+            profit = 0.0
+            if bjCard is not None:
+                profit -= self.cnt[bjCard] / self.total - self._both_bj(bjCard)
+
+            # Hands the dealer does not check as blackjack, card by card
+            for c in range(1, 11):
+                if self.cnt[c]:
+                    p = self._draw(c)
+                    profit += p * self._player(self.moveP, 0, d, PLAYERfirst[c] - 1)
+                    self._undraw(c)
+
+            self._undraw(d)
+            playerAdvantage += pUp * profit
+        return playerAdvantage
+
+    def stats(self):
+        """
+        Cache counters and sizes.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'player': len(self.playerCache), 'dealer': len(self.dealerCache)}
+
+    def _draw(self, k):
+        p = self.cnt[k] / self.total
+        self.cnt[k] -= 1
+        self.total -= 1
+        self.key -= 1 << (_BITS * (k - 1))
+        return p
+
+    def _undraw(self, k):
+        self.cnt[k] += 1
+        self.total += 1
+        self.key += 1 << (_BITS * (k - 1))
+
+    def _both_bj(self, bjCard):
+        # Probability that the player's two cards and the dealer's hole card all make blackjack
+        p = 0.0
+        for c1, c2 in ((9, 10), (10, 9)):
+            if self.cnt[c1]:
+                p1 = self._draw(c1)
+                if self.cnt[c2]:
+                    p2 = self._draw(c2)
+                    p += p1 * p2 * self.cnt[bjCard] / self.total
+                    self._undraw(c2)
+                self._undraw(c1)
+        return p
+
+    def _lookup(self, cache, key):
+        value = cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            cache.move_to_end(key)
+        return value
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.cacheSize:
+            cache.popitem(last=False)
+            self.evictions += 1
+
+    def _player(self, moves, chain, d, s):
+        """
+        Expected profit of the player's hand from state s (0-based) on up-card d,
+        jointly with the dealer not holding blackjack, for the remaining shoe.
+        """
+        move = moves[d][s]
+        while isinstance(move, int):
+            s = move
+            move = moves[d][s]
+        if move is None:
+            return self._terminal(chain, d, s)
+
+        key = (chain, d, s, self.key)
+        value = self._lookup(self.playerCache, key)
+        if value is not None:
+            return value
+
+        if not self.total:
+            raise ValueError("the shoe ran out of cards")
+        value = 0.0
+        for k, t in move:
+            if self.cnt[k]:
+                p = self._draw(k)
+                value += p * self._player(moves, chain, d, t)
+                self._undraw(k)
+
+        self._store(self.playerCache, key, value)
+        return value
+
+    def _terminal(self, chain, d, s):
+        i = self.splitCard.get(s)
+        if i is None:
+            return float(self.W[s] @ self._dealer(d))
+        if self.resplit[d][i]:
+            return self._split(d, i, 2, self.rules.MSH - 2, ())
+        return 2.0 * self._player(self.movePS, 1, d, setup_variables.PLAYERfirst[i] - 1)
+
+    def _split(self, d, i, pending, resplits, hands):
+        """
+        Expected profit of splitting a pair of card i + 1 on up-card d with
+        resplits, pending hands still to be dealt their second card and
+        hands the states (0-based) the others reached with theirs.  Only
+        the second cards decide the resplits, so they are dealt first, one
+        per hand (a pair card while resplits are left making one more
+        hand); each hand then plays on from the shoe they leave, settled
+        against the dealer drawing right after it.  Neither the hands' play
+        nor the dealer's looks at the others' cards, so this order gives
+        the same result as the table's.
+        """
+        if not pending:
+            return sum(self._player(self.movePS, 1, d, s) for s in hands)
+
+        key = ('split', d, i, pending, resplits, hands, self.key)
+        value = self._lookup(self.playerCache, key)
+        if value is not None:
+            return value
+
+        if not self.total:
+            raise ValueError("the shoe ran out of cards")
+        value = 0.0
+        for k, t in self.movePS[d][setup_variables.PLAYERfirst[i] - 1]:
+            if self.cnt[k]:
+                p = self._draw(k)
+                if k == i and resplits:
+                    value += p * self._split(d, i, pending + 1, resplits - 1, hands)
+                else:
+                    value += p * self._split(d, i, pending - 1, resplits, tuple(sorted(hands + (t,))))
+                self._undraw(k)
+
+        self._store(self.playerCache, key, value)
+        return value
+
+    def _dealer(self, d):
+        """
+        Probabilities of the dealer's terminal states on up-card d for the
+        remaining shoe, summed over the dealer's hands (see _dealer_hands).
+        """
+        key = (d, self.key)
+        dist = self._lookup(self.dealerCache, key)
+        if dist is not None:
+            return dist
+
+        hands = self.dealerHands[d]
+        cnt = np.array(self.cnt[1:], dtype=float)
+
+        # Falling factorials: ways to draw m cards of each rank, and m cards in all
+        ways = np.ones((10, len(hands.m) + 1))
+        ways[:, 1:] = np.cumprod(np.maximum(cnt[:, None] - hands.m, 0), axis=1)
+        orders = np.ones(len(hands.n) + 1)
+        orders[1:] = np.cumprod(np.maximum(self.total - hands.n, 1), dtype=float)
+
+        prob = hands.mult * np.prod(ways.ravel()[hands.ways], axis=1) / orders[hands.length]
+        dist = np.bincount(hands.outcome, prob, minlength=setup_variables.numDealerStates)
+
+        self._store(self.dealerCache, key, dist)
+        return dist
+
+
+def _moves(topo, absorbing):
+    """
+    The compiled topology as per-state moves, indexed [dealer][state] (0-based):
+    None for an absorbing state, an int for a sure move to that state, or a
+    list of (k, state) pairs for drawing card k + 1.
+    """
+    shape3 = topo.shape if len(topo.shape) == 3 else (1,) + topo.shape
+    moves = [[[] for _ in range(shape3[1])] for _ in range(shape3[0])]
+    for d, f, t, k in zip(topo.dealer_idx, topo.from_idx, topo.to_idx, topo.rank_idx):
+        if k == -1:
+            moves[d][f] = int(t)
+        else:
+            moves[d][f].append((int(k), int(t)))
+    for block in moves:
+        for s in absorbing - 1:
+            block[s] = None
+    return moves
+
+
+def _dealer_hands(moves, s):
+    """
+    Every way the dealer can draw from state s (0-based) to a terminal state,
+    grouped by the cards drawn: a draw order has probability
+    prod_k cnt[k]!/(cnt[k]-counts[k])! / (total!/(total-length)!) for any shoe,
+    so each group needs only its multiset (counts, shape (10,)), its length,
+    its terminal state (outcome) and the number of orders (mult).
+    """
+    groups = {}
+
+    def walk(s, drawn):
+        move = moves[s]
+        while isinstance(move, int):
+            s = move
+            move = moves[s]
+        if move is None:
+            key = (s, tuple(drawn))
+            groups[key] = groups.get(key, 0) + 1
+            return
+        for k, t in move:
+            drawn[k - 1] += 1
+            walk(t, drawn)
+            drawn[k - 1] -= 1
+
+    walk(s, [0] * 10)
+
+    hands = SimpleNamespace()
+    hands.outcome = np.array([key[0] for key in groups])
+    hands.counts  = np.array([key[1] for key in groups])
+    hands.length  = hands.counts.sum(axis=1)
+    hands.mult    = np.array(list(groups.values()), dtype=float)
+
+    # Draw counts and lengths the falling factorials run to, and where each
+    # hand's ways to draw its counts of every rank lie in their flattened table
+    hands.m    = np.arange(hands.counts.max())
+    hands.n    = np.arange(hands.length.max())
+    hands.ways = np.arange(10) * (len(hands.m) + 1) + hands.counts
+    return hands
@@ -0,0 +1,52 @@
+import argparse
+import subprocess
+import sys
+
+# Modules that make up the engine; importing them must need numpy only
+CORE_MODULES = ('setup_variables', 'set_strategy', 'absorb_chain', 'sparse_trans', 'compile_topology',
+                'calc_player_trans', 'calc_player_trans_split', 'calc_dealer_trans',
+                'compute_term_profit', 'adv_single_hand', 'adv_single_hand_batch',
+                'engine', 'adv_cache', 'sweep_rules')
+HEAVY_MODULES = ('matplotlib', 'pandas', 'scipy')
+
+_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import {modules}
+print(time.perf_counter() - t0)
+print(' '.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+def import_time(modules=CORE_MODULES, repeats=5):
+    """
+    Wall time (seconds) to import modules in a fresh interpreter, best of
+    repeats, and the heavy optional packages (see HEAVY_MODULES) they pulled in.
+    """
+    probe = _PROBE.format(modules=', '.join(modules), heavy=HEAVY_MODULES)
+    best = float('inf')
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', probe], check=True, capture_output=True, text=True).stdout
+        seconds, heavy = (out.splitlines() + [''])[:2]
+        best = min(best, float(seconds))
+    return best, heavy.split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of the engine against a budget.")
+    parser.add_argument('--budget', type=float, default=0.3, help="seconds allowed (default: 0.3)")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    seconds, heavy = import_time(repeats=args.repeats)
+    print(f"import time {seconds * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    if heavy:
+        print(f"FAIL: optional packages imported eagerly: {', '.join(heavy)}")
+        return 1
+    if seconds > args.budget:
+        print("FAIL: over budget")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from absorb_chain import absorb_rows
+from compile_topology import fill_trans
+from calc_dealer_trans import compile_dealer_trans
+from compute_term_profit import payoff_matrix
+from calc_player_trans import hit_total
+from calc_player_trans_split import split_profit
+
+def optimal_strategy(deck, houseRules=None):
+    """
+    Returns the EV-maximizing strategy for the deck distribution (10 entries,
+    A, 2..10; counts are normalized), or a stack of tables for decks of shape
+    (..., 10): a namespace with fields 'bet', 'PAIR',
+    'SOFT', 'HARD' in the move encoding of setup_variables.playerMoves, as
+    set_strategy('basic') returns.  The EVs of every move are kept in
+    strategy.EV (see action_evs).  houseRules defaults to setup_variables.houseRules.
+    """
+    return action_evs(deck, houseRules).strategy
+
+
+def action_evs(deck, houseRules=None):
+    """
+    Solves the player's decisions by backward induction over the totals, on
+    the same chains the transition builders produce, for every dealer up-card
+    and every deck of a stack of shape (..., 10) at once.
+    Returns a namespace with HARD (..., 18, 10, 6), SOFT (..., 10, 10, 6) and
+    PAIR (..., 10, 10, 6) arrays: the EV per unit bet of each move (last axis, indexed
+    by the move codes) in each cell, NaN where the move is not available, the
+    dealer not holding blackjack; DB and DS hold the same (double) EV.  The
+    field strategy holds the resulting tables.
+
+    A cell covers both the two-card hand and the later hands with the same
+    total: DB/DS pick hit/stand for the later hands, and surrender and split
+    fall back to hitting there, as in calc_player_trans.  So where standing
+    beats hitting, SR is chosen only if it still gains once the later hands
+    that hit instead are counted (see _surrender_gains).  With
+    houseRules.MSA, SP counts the resplits up to houseRules.MSH hands, as
+    calc_player_trans_split.split_profit does.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    mv = setup_variables.playerMoves
+    S, DB, DS, H, SP, SR = mv.S, mv.DB, mv.DS, mv.H, mv.SP, mv.SR
+
+    deck = np.array(deck, dtype=float)
+    lead = deck.shape[:-1]
+    deck = deck.reshape(-1, 10)
+    deck = deck / np.sum(deck, axis=1, keepdims=True)
+    deck = np.concatenate([deck, deck[:, :1]], axis=1)
+    p = deck[:, 1:, None]               # cards 2..11, shape: (B, 10, 1)
+    B = len(deck)
+
+    # Dealer's final totals per up-card, given no blackjack
+    PD = fill_trans(compile_dealer_trans(houseRules), deck)
+    pdRow = absorb_rows(PD, setup_variables.DEALERlevels, setup_variables.DEALERfirst[1:])
+    pdRow[..., setup_variables.DEALERbj - 1] = 0
+    pdRow /= np.sum(pdRow, axis=-1, keepdims=True)
+
+    # Profit of standing on each total, and of standing after a double
+    profit = np.moveaxis(pdRow @ payoff_matrix().T, -1, 0)   # shape: (122, B, 10)
+    stand = np.full((22, B, 10), np.nan)
+    doub  = np.full((22, B, 10), np.nan)
+    stand[4:22] = profit[setup_variables.PLAYERstand[3:21] - 1]
+    doub[6:22]  = profit[setup_variables.PLAYERdoubStand[5:21] - 1]
+
+    hitHard  = np.full((22, B, 10), np.nan)   # EV of hitting a hard / soft total
+    hitSoft  = np.full((22, B, 10), np.nan)
+    dblHard  = np.full((22, B, 10), np.nan)   # EV of doubling a hard / soft total
+    dblSoft  = np.full((22, B, 10), np.nan)
+    laterHard = np.full((22, B, 10), np.nan)  # EV of a hand of three or more cards
+    laterSoft = np.full((22, B, 10), np.nan)
+
+    HARD = np.zeros((B, 18, 10), dtype=int)
+    SOFT = np.zeros((B, 10, 10), dtype=int)
+    PAIR = np.zeros((B, 10, 10), dtype=int)
+    EV = SimpleNamespace(HARD=np.full((B, 18, 10, 6), np.nan), SOFT=np.full((B, 10, 10, 6), np.nan),
+                         PAIR=np.full((B, 10, 10, 6), np.nan))
+
+    def draw(tot, soft):
+        # Next total and softness after each card 2..11, as in calc_player_trans
+        for c in range(2, 12):
+            yield (p[:, c - 2],) + hit_total(tot, soft, c)
+
+    def hit_ev(tot, soft):
+        ev = 0.0
+        for pc, t, s in draw(tot, soft):
+            ev = ev + pc * (-1.0 if t > 21 else (laterSoft[t] if s else laterHard[t]))
+        return ev
+
+    def double_ev(tot, soft):
+        ev = 0.0
+        for pc, t, s in draw(tot, soft):
+            ev = ev + pc * (-2.0 if t > 21 else doub[t])
+        return ev
+
+    def decide(evs, table, row, allowSR=True):
+        # evs: shape (B, 10, 6) for one table row; returns the moves
+        options = np.where(np.isnan(evs), -np.inf, evs)
+        options[..., SR] = np.where(allowSR, options[..., SR], -np.inf)
+        best = np.argmax(options[..., [S, H, DB, SP, SR]], axis=-1)
+        moves = np.array([S, H, DB, SP, SR])[best]
+        # A double hits or stands in the later hands
+        moves[(moves == DB) & (evs[..., S] >= evs[..., H])] = DS
+        table[:, row] = moves
+        return moves
+
+    def settle(tot, soft, ev, table, row):
+        ev[..., S]  = stand[tot]
+        ev[..., H]  = hit_ev(tot, soft)
+        ev[..., DB] = ev[..., DS] = double_ev(tot, soft)
+        if houseRules.SRA:
+            ev[..., SR] = -0.5
+        # Surrender hits the later hands: free only where hitting beats standing
+        allowSR = (allowSoftSR if soft else allowHardSR)[:, row]
+        moves = decide(ev, table, row, (ev[..., H] >= ev[..., S]) | allowSR)
+        later = np.where(np.isin(moves, (S, DS)), ev[..., S], ev[..., H])
+        (laterSoft if soft else laterHard)[tot] = later
+        (hitSoft if soft else hitHard)[tot] = ev[..., H]
+        (dblSoft if soft else dblHard)[tot] = ev[..., DB]
+
+    # Where standing beats hitting, surrender is only played once the
+    # hands that reach the cell later have been weighed in (see
+    # _surrender_gains); the tables are solved again until that settles
+    allowHardSR = np.zeros((B, 18, 10), dtype=bool)
+    allowSoftSR = np.zeros((B, 10, 10), dtype=bool)
+    for _ in range(4):
+        # Hard 21..11 need only higher hard totals, soft totals only higher soft
+        # totals and hard totals of 12 and up, hard 10..4 the soft totals
+        for tot in range(21, 10, -1):
+            settle(tot, False, EV.HARD[:, tot - 4], HARD, tot - 4)
+        for tot in range(21, 11, -1):
+            settle(tot, True, EV.SOFT[:, tot - 12], SOFT, tot - 12)
+        for tot in range(10, 3, -1):
+            settle(tot, False, EV.HARD[:, tot - 4], HARD, tot - 4)
+
+        # --- Pairs ---
+        for ii in range(2, 12):
+            pTot, pSoft = (12, True) if ii == 11 else (2 * ii, False)
+            ev = EV.PAIR[:, ii - 2]
+            ev[..., S]  = stand[pTot]
+            ev[..., H]  = hit_ev(pTot, pSoft)
+            ev[..., DB] = ev[..., DS] = double_ev(pTot, pSoft)
+            if houseRules.SRA:
+                ev[..., SR] = -0.5
+            single, pair = _split_ev(ii, p, stand, hitHard, hitSoft, dblHard, dblSoft, HARD, SOFT, houseRules)
+            resplit = None
+            if houseRules.MSA:
+                # Splitting a pair splits it again whenever it is dealt, aces only with HASAA
+                prob = p[:, ii - 2] if ii != 11 or houseRules.HASAA else np.zeros_like(p[:, 0])
+                resplit = SimpleNamespace(prob=prob, hands=houseRules.MSH)
+            ev[..., SP] = split_profit(single, pair, resplit)
+            decide(ev, PAIR, ii - 2)
+
+        if not houseRules.SRA:
+            break
+        gainHard, gainSoft = _surrender_gains(p, EV, HARD, SOFT, PAIR)
+        if np.array_equal(gainHard > 0, allowHardSR) and np.array_equal(gainSoft > 0, allowSoftSR):
+            break
+        allowHardSR, allowSoftSR = gainHard > 0, gainSoft > 0
+
+    strategy = SimpleNamespace()
+    strategy.bet  = 1
+    strategy.PAIR = PAIR.reshape(lead + PAIR.shape[1:])
+    strategy.HARD = HARD.reshape(lead + HARD.shape[1:])
+    strategy.SOFT = SOFT.reshape(lead + SOFT.shape[1:])
+    for name in ('HARD', 'SOFT', 'PAIR'):
+        ev = getattr(EV, name)
+        setattr(EV, name, ev.reshape(lead + ev.shape[1:]))
+    strategy.EV   = EV
+    EV.strategy   = strategy
+    return EV
+
+
+def _surrender_gains(p, EV, HARD, SOFT, PAIR):
+    """
+    Gain of surrender over the best other move in each HARD and SOFT cell,
+    shape (B, rows, 10) each, counting the hands of three or more cards
+    that reach the cell and hit after a surrender: the two-card gain times
+    how often the two-card hand is dealt, less the later hands' loss
+    (the better of hit and stand against hit) times how often they reach
+    the cell, the other cells played as the tables say.
+    """
+    mv = setup_variables.playerMoves
+    S, DB, H, SR = mv.S, mv.DB, mv.H, mv.SR
+    B = p.shape[0]
+
+    # How often each total is reached as a two-card hand and with more cards, soft at [1]
+    two   = np.zeros((2, 22, B, 10))
+    later = np.zeros((2, 22, B, 10))
+    pairHit = np.zeros((2, 22, B, 10))
+    for i in range(2, 12):
+        for j in range(2, 12):
+            pij = p[:, i - 2] * p[:, j - 2]
+            if i == j:
+                tot, soft = (12, True) if i == 11 else (2 * i, False)
+                pairHit[int(soft), tot] += pij * (PAIR[:, i - 2] == H)
+                continue
+            tot, soft = hit_total(i, i == 11, j)
+            if not (soft and tot == 21):
+                two[int(soft), tot] += pij
+
+    # A hit only raises a hard total below 12; above, soft hands turn hard
+    order = [(t, False) for t in range(4, 12)] + [(t, True) for t in range(12, 22)] + \
+            [(t, False) for t in range(12, 22)]
+    for tot, soft in order:
+        moves = SOFT[:, tot - 12] if soft else HARD[:, tot - 4]
+        mass = (two[int(soft), tot] * (moves == H) + later[int(soft), tot] * np.isin(moves, (H, DB, SR))
+                + pairHit[int(soft), tot])
+        for c in range(2, 12):
+            t, s = hit_total(tot, soft, c)
+            if t <= 21:
+                later[int(s), t] += mass * p[:, c - 2]
+
+    gains = []
+    for ev, low, soft in ((EV.HARD, 4, False), (EV.SOFT, 12, True)):
+        rows = np.arange(low, 22)
+        other = np.max(np.where(np.isnan(ev), -np.inf, ev)[..., [S, H, DB]], axis=-1)
+        # Whatever the other move, the later hands play the better of hit and stand
+        gain = (np.moveaxis(two[int(soft), rows], 0, 1) * (ev[..., SR] - other)
+                + np.moveaxis(later[int(soft), rows], 0, 1) * (ev[..., H] - np.fmax(ev[..., S], ev[..., H])))
+        gains.append(np.where(np.isnan(gain), -np.inf, gain))
+    return tuple(gains)
+
+
+def _split_ev(ii, p, stand, hitHard, hitSoft, dblHard, dblSoft, HARD, SOFT, houseRules):
+    """
+    EV of one hand after splitting a pair of ii's, following the split
+    chain of calc_player_trans_split without resplitting, and that of its
+    pair state (a pair of ii's dealt again, played by its total): the
+    single and pair of calc_player_trans_split.split_profit.
+    """
+    mv = setup_variables.playerMoves
+
+    ev = 0.0
+    pair = 0.0
+    for c in range(2, 12):
+        tot, soft = hit_total(ii, ii == 11, c)
+        if ii == 11 and not houseRules.HASAA:
+            ev = ev + p[:, c - 2] * stand[tot]
+            continue
+
+        moves = SOFT[:, tot - 12] if soft else HARD[:, tot - 4]
+
+        # Rule overrides of the split chain; a new pair plays its total
+        if c != ii and not houseRules.DASA:
+            moves = np.where(moves == mv.DB, mv.H, np.where(moves == mv.DS, mv.S, moves))
+        if not houseRules.SRA:
+            moves = np.where(moves == mv.SR, mv.H, moves)
+
+        hit = hitSoft[tot] if soft else hitHard[tot]
+        dbl = dblSoft[tot] if soft else dblHard[tot]
+        value = np.select([moves == mv.S, moves == mv.H, np.isin(moves, (mv.DB, mv.DS)), moves == mv.SR],
+                          [stand[tot], hit, dbl, -0.5])
+        ev = ev + p[:, c - 2] * value
+        if c == ii:
+            pair = value
+    return ev, pair
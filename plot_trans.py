@@ -0,0 +1,99 @@
+import numpy as np
+import setup_variables
+
+# Plotting helpers for the transition matrices.  matplotlib is imported inside
+# the functions, so neither this module nor the engine pulls it in at load time.
+
+def player_state_labels():
+    """
+    Names of the player's states, indexed by state name - 1.
+    """
+    sv = setup_variables
+    labels = [''] * sv.numPlayerStates
+
+    groups = [('first', sv.PLAYERfirst, 2, 12), ('twoHard', sv.PLAYERtwoHard, 4, 22),
+              ('twoSoft', sv.PLAYERtwoSoft, 12, 22), ('pair', sv.PLAYERpair, 2, 12),
+              ('hard', sv.PLAYERhard, 5, 22), ('soft', sv.PLAYERsoft, 13, 22),
+              ('stand', sv.PLAYERstand, 4, 22), ('doubStand', sv.PLAYERdoubStand, 6, 22),
+              ('split', sv.PLAYERsplit, 2, 12)]
+    for name, states, lo, hi in groups:
+        for i in range(lo, hi):
+            labels[states[i - 1] - 1] = f"{name}{i}"
+
+    labels[sv.PLAYERbj        - 1] = 'bj'
+    labels[sv.PLAYERsurrender - 1] = 'surrender'
+    labels[sv.PLAYERbust      - 1] = 'bust'
+    labels[sv.PLAYERdoubBust  - 1] = 'doubBust'
+    return labels
+
+
+def dealer_state_labels():
+    """
+    Names of the dealer's states, indexed by state name - 1.
+    """
+    sv = setup_variables
+    labels = [''] * sv.numDealerStates
+
+    groups = [('first', sv.DEALERfirst, 2, 12), ('hard', sv.DEALERhard, 4, 18),
+              ('soft', sv.DEALERsoft, 12, 18), ('stand', sv.DEALERstand, 17, 22)]
+    for name, states, lo, hi in groups:
+        for i in range(lo, hi):
+            labels[states[i - 1] - 1] = f"{name}{i}"
+
+    labels[sv.DEALERbj   - 1] = 'bj'
+    labels[sv.DEALERbust - 1] = 'bust'
+    return labels
+
+
+def plot_trans(T, labels, fontsize=5, ax=None):
+    """
+    Heat map of a square transition matrix T with the state labels on both axes.
+    Draws on ax if given, else on a new figure; returns the axes.
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(10, 10))
+    cax = ax.imshow(T, cmap='jet', interpolation='nearest', vmin=0, vmax=1)
+    ax.figure.colorbar(cax, ax=ax, shrink=0.75, label='')
+
+    ax.set_xticks(np.arange(len(labels)))
+    ax.set_yticks(np.arange(len(labels)))
+    ax.set_xticklabels(labels, rotation=90, fontsize=fontsize)
+    ax.set_yticklabels(labels, fontsize=fontsize)
+
+    ax.xaxis.tick_top()
+    ax.tick_params(axis='x', labeltop=True, labelbottom=False)
+    ax.figure.tight_layout()
+    return ax
+
+
+def plot_player_trans(P, dealerCard=2, ax=None):
+    """
+    Plots the player's transitions (P, Pinf or PSinf, shape (11, 122, 122))
+    against the dealer's up-card dealerCard (2..11).
+    """
+    return plot_trans(P[dealerCard - 1], player_state_labels(), 5, ax)
+
+
+def plot_dealer_trans(PD, ax=None):
+    """
+    Plots the dealer's transitions (PD or PDinf, shape (37, 37)).
+    """
+    return plot_trans(PD, dealer_state_labels(), 6, ax)
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    from set_strategy import set_strategy
+    from calc_player_trans import calc_player_trans
+    from calc_dealer_trans import calc_dealer_trans
+
+    setup_variables.setup_variables()
+    deck = np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 4, 1], dtype=float) / 13
+
+    calc_player_trans(deck, set_strategy('basic'))
+    calc_dealer_trans(deck)
+    plot_player_trans(setup_variables.P)
+    plot_dealer_trans(setup_variables.PDinf)
+    plt.show()
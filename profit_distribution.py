@@ -0,0 +1,108 @@
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from compute_term_profit import payoff_matrix
+
+def fold_distribution(probs, pFirst, psFirst, pdRow, resplit=None):
+    """
+    Folds absorbed first-card rows, as adv_single_hand_batch.fold_profits
+    takes them, into the distribution of the player's profit per hand
+    instead of its mean.  A split hand's outcomes are combined over its
+    hands given the dealer's final total, which they all share.
+    Returns a namespace with values (the profits, in steps of 0.5 up to
+    2 per hand of the largest split), upcard (..., 10, len(values)): the
+    probability of each profit per up-card 2..11 (0 for an up-card with
+    probability 0), overall (..., len(values)), and its advantage (mean)
+    and variance.
+    """
+    PLAYERsplit = setup_variables.PLAYERsplit
+    PLAYERbj    = setup_variables.PLAYERbj
+    DEALERbj    = setup_variables.DEALERbj
+
+    hands = 2 if resplit is None else resplit.hands
+    center = 4 * hands
+    values = np.arange(-center, center + 1) / 2
+
+    # Dealer's final totals 17..21 and bust, given no blackjack
+    final = np.append(setup_variables.DEALERstand[16:21], setup_variables.DEALERbust) - 1
+    probDealerBJ = pdRow[..., DEALERbj - 1]
+    pd = pdRow[..., final]
+    norm = np.sum(pd, axis=-1, keepdims=True)
+    pd = np.divide(pd, norm, out=np.zeros_like(pd), where=norm > 0)
+
+    O = _outcomes(final, center)
+    pRow = np.einsum('...k,...dks->...ds', probs, pFirst)   # (..., 10, 122)
+
+    # One post-split hand per pair card, given the dealer's final total
+    q = np.einsum('...is,stv->...itv', psFirst[..., :10, :], O)
+    qPair = None if resplit is None else np.einsum('...is,stv->...itv', psFirst[..., 10:, :], O)
+    split = _split_distribution(q, qPair, resplit, center)
+
+    noBJ = np.einsum('...ds,...dt,stv->...dv', pRow, pd, O)
+    noBJ += np.einsum('...di,...dt,...ditv->...dv', pRow[..., PLAYERsplit[1:] - 1], pd, split)
+
+    upcard = (1.0 - probDealerBJ)[..., None] * noBJ
+    upcard[..., center - 2] += probDealerBJ * (1.0 - pRow[..., PLAYERbj - 1])
+    upcard[..., center] += probDealerBJ * pRow[..., PLAYERbj - 1]
+    upcard = np.where(probs[..., None] > 0, upcard, 0.0)
+
+    dist = SimpleNamespace()
+    dist.values    = values
+    dist.upcard    = upcard
+    dist.overall   = np.einsum('...d,...dv->...v', probs, upcard)
+    dist.advantage = dist.overall @ values
+    dist.variance  = dist.overall @ values**2 - dist.advantage**2
+    return dist
+
+
+def _outcomes(final, center):
+    """
+    One-hot profits of the player's terminal states against the dealer's
+    final states: shape (122, len(final), 2 * center + 1) on the grid of
+    fold_distribution.  Split states get no outcome of their own.
+    """
+    W = payoff_matrix()[:, final]
+    O = (np.rint(2 * W).astype(int)[..., None] + center == np.arange(2 * center + 1)).astype(float)
+    O[setup_variables.PLAYERsplit[1:] - 1] = 0
+    return O
+
+
+def _split_distribution(q, qPair, resplit, center):
+    """
+    Profit distribution of a split, summed over its hands, from the one-hand
+    distributions q (and qPair of the pair state); the recursion of
+    calc_player_trans_split.split_profit with sums of independent hands as
+    convolutions.
+    """
+    if resplit is None:
+        return _convolve(q, q, center)
+    p = resplit.prob[..., None, None]
+    a = q - p * qPair
+    none = np.zeros_like(q)
+    none[..., center] = 1
+    memo = {}
+
+    def G(n, r):
+        if n == 0:
+            return none
+        if (n, r) not in memo:
+            if r == 0:
+                memo[n, r] = q if n == 1 else _convolve(q, G(n - 1, 0), center)
+            else:
+                memo[n, r] = _convolve(a, G(n - 1, r), center) + p * G(n + 1, r - 1)
+        return memo[n, r]
+
+    return G(2, resplit.hands - 2)
+
+
+def _convolve(x, y, center):
+    # Distribution of the sum of two independent profits on the grid (last axis)
+    n = x.shape[-1]
+    out = np.zeros(np.broadcast_shapes(x.shape, y.shape))
+    for j in np.flatnonzero(np.any(x != 0, axis=tuple(range(x.ndim - 1)))):
+        shift = j - center
+        if shift >= 0:
+            out[..., shift:] += x[..., j:j + 1] * y[..., :n - shift]
+        else:
+            out[..., :shift] += x[..., j:j + 1] * y[..., -shift:]
+    return out
@@ -1,12 +1,17 @@
 from types import SimpleNamespace
 import setup_variables
+from optimal_strategy import optimal_strategy
 
-def set_strategy(type):
+def set_strategy(type, houseRules=None, deck=None):
     """
     Returns strategy: a namespace with fields 'bet', 'PAIR', 'SOFT', 'HARD'
+    houseRules defaults to setup_variables.houseRules.
+    type 'optimal' solves the tables for deck (10 entries, A, 2..10), which
+    it requires.
     """
     # Pull the already-initialized objects out of setup_variables
-    houseRules = setup_variables.houseRules
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
     basic       = setup_variables.basic
 
     if type == 'basic':
@@ -22,6 +27,11 @@ def set_strategy(type):
         strategy.SOFT = basic.softStrategy
         return strategy
 
+    elif type == 'optimal':
+        if deck is None:
+            raise ValueError("the 'optimal' strategy needs the deck to solve for")
+        return optimal_strategy(deck, houseRules)
+
     else:
         print("Unknown type!")
         return None
@@ -6,20 +6,23 @@ def setup_variables():
     global PLAYERfirst, PLAYERtwoHard, PLAYERhard, PLAYERtwoSoft, PLAYERsoft
     global PLAYERpair, PLAYERstand, PLAYERdoubStand, PLAYERsplit
     global PLAYERbj, PLAYERsurrender, PLAYERbust, PLAYERdoubBust, numPlayerStates
+    global PLAYERlevels, PLAYERabsorbing
 
     global DEALERfirst, DEALERhard, DEALERsoft, DEALERstand
     global DEALERbj, DEALERbust, numDealerStates
+    global DEALERlevels, DEALERabsorbing
 
     global houseRules
     global playerMoves
-    global P, PD, Pinf, PSinf, PDinf
+    global P, PD, Pinf, PSinf, PDinf, Pcsr, PDcsr
     global basic
 
     #%% Define playing rules
     houseRules = SimpleNamespace()
     houseRules.DSSS = 1    # Dealer stands on soft 17
     houseRules.DASA = 1    # Double after split allowed
-    houseRules.MSA = 0     # Multiple splits allowed (CODE NOT CONFIGURED FOR "YES")
+    houseRules.MSA = 0     # Multiple splits allowed (resplitting)
+    houseRules.MSH = 4     # Most hands a pair may be split into, with MSA
     houseRules.HASAA = 0   # Hit after split aces allowed (resplitting also allowed)
     houseRules.SRA = 0     # Surrender allowed (after dealer checks for bj and before player draws cards)
 
@@ -48,7 +51,37 @@ def setup_variables():
     DEALERbj         = 36
     DEALERbust       = 37
 
-    numDealerStates = DEALERbust  # 37 
+    numDealerStates = DEALERbust  # 37
+
+    # Absorption order: transient states grouped by hard total (aces counted as 1),
+    # which grows with every card drawn. Groups run from the highest total down, so
+    # each group only leads to absorbing states or to groups listed before it.
+    playerTot = np.zeros(numPlayerStates, dtype=int)
+    for ii in range(2, 12):
+        playerTot[PLAYERfirst[ii - 1] - 1] = 1 if ii == 11 else ii
+        playerTot[PLAYERpair[ii - 1] - 1]  = 2 if ii == 11 else 2 * ii
+    for ii in range(4, 22):
+        playerTot[PLAYERtwoHard[ii - 1] - 1] = ii
+    for ii in range(5, 22):
+        playerTot[PLAYERhard[ii - 1] - 1] = ii
+    for ii in range(12, 22):
+        playerTot[PLAYERtwoSoft[ii - 1] - 1] = ii - 10
+    for ii in range(13, 22):
+        playerTot[PLAYERsoft[ii - 1] - 1] = ii - 10
+
+    PLAYERlevels    = [np.flatnonzero(playerTot == t) + 1 for t in range(21, 0, -1)]
+    PLAYERabsorbing = np.flatnonzero(playerTot == 0) + 1
+
+    dealerTot = np.zeros(numDealerStates, dtype=int)
+    for ii in range(2, 12):
+        dealerTot[DEALERfirst[ii - 1] - 1] = 1 if ii == 11 else ii
+    for ii in range(4, 18):
+        dealerTot[DEALERhard[ii - 1] - 1] = ii
+    for ii in range(12, 18):
+        dealerTot[DEALERsoft[ii - 1] - 1] = ii - 10
+
+    DEALERlevels    = [np.flatnonzero(dealerTot == t) + 1 for t in range(17, 0, -1)]
+    DEALERabsorbing = np.flatnonzero(dealerTot == 0) + 1
 
     # Possible moves for the player (elements of strategy tables)
     playerMoves = SimpleNamespace()
@@ -68,6 +101,10 @@ def setup_variables():
     PSinf = np.zeros((11, numPlayerStates, numPlayerStates))   # Player's hand after splitting a pair
     PDinf = np.zeros((numDealerStates, numDealerStates))       # Dealer's hand
 
+    # Sparse (CSR) transition matrices, filled instead of P and PD by the sparse backend
+    Pcsr  = None
+    PDcsr = None
+
     #%% Basic Strategy Tables
     S  = 0 
     DB = 1  
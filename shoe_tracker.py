@@ -0,0 +1,98 @@
+import numpy as np
+from engine import Engine
+from calc_player_trans_split import resplit_probs
+from adv_single_hand_batch import fold_profits
+
+DECK = np.array([4, 4, 4, 4, 4, 4, 4, 4, 4, 16], dtype=float)   # Rank counts of one deck, A, 2..10
+RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10')
+
+class ShoeTracker:
+    """
+    Follows a shoe as cards are dealt: remove(rank) takes one card out and
+    brings advantage and profits (per up-card 2..11) up to date.
+    Each topology keeps counts @ A (see compile_topology.compile_topology)
+    and updates it by the one basis row of the dealt rank, which saves the
+    product with the basis, but every drawn transition is a count over the
+    new total, so each card still rewrites all the stored entries and
+    absorbs the first-card rows again in the workspaces of its Engine: a
+    card costs only some 15% less than Engine.advantage on the new shoe.
+    A change the shoe cannot take raises ValueError and leaves it as it was.
+    """
+    def __init__(self, decks=6, rules=None, strategy=None, counts=None):
+        self.engine = Engine(rules, strategy)
+        self.topos = (self.engine.topoP, self.engine.topoStart, self.engine.topoPD)
+        self.reset(decks, counts)
+
+    def reset(self, decks=6, counts=None):
+        """
+        Starts a new shoe of decks decks, or of the given rank counts (A, 2..10).
+        """
+        counts = np.array(DECK * decks if counts is None else counts, dtype=float)
+        if counts.shape != (10,) or np.any(counts < 0):
+            raise ValueError("counts must be 10 non-negative rank counts, A..10")
+        if np.sum(counts) < 1:
+            raise ValueError("the shoe is empty")
+        self.counts = counts
+
+        cards = np.append(self.counts[1:], self.counts[0])   # cards 2..11
+        self._drawn = [cards @ topo.A for topo in self.topos]
+
+        # Only the stored entries ever change, so the workspaces are cleared once here
+        for T in (self.engine.P, self.engine.start, self.engine.PD):
+            T.fill(0)
+        self._update()
+
+    def remove(self, rank):
+        """
+        Takes one card of rank ('A', '2'..'10', or 1..11 with 1 and 11 for the
+        ace) out of the shoe.  Returns the new advantage.
+        """
+        return self._change(rank, -1)
+
+    def add(self, rank):
+        """
+        Puts one card of rank back into the shoe (undoes remove).  Returns the new advantage.
+        """
+        return self._change(rank, +1)
+
+    def _change(self, rank, step):
+        j = _rank_index(rank)
+        if step < 0 and self.counts[j] < 1:
+            raise ValueError(f"no {RANKS[j]} left in the shoe")
+        if np.sum(self.counts) + step < 1:
+            raise ValueError("the shoe is empty")
+        self.counts[j] += step
+
+        k = 10 if j == 0 else j     # basis row of the card: 2..10 at 1..9, ace at 10
+        for drawn, topo in zip(self._drawn, self.topos):
+            drawn += step * topo.A[k - 1]
+        self._update()
+        return self.advantage
+
+    def _update(self):
+        total = np.sum(self.counts)
+        e = self.engine
+        with e._lock:
+            for T, drawn, topo in zip((e.P, e.start, e.PD), self._drawn, self.topos):
+                T.reshape(-1)[topo.support] = topo.T0 + drawn / total
+            e._absorb_filled()
+
+            probs = np.append(self.counts[1:], self.counts[0]) / total
+            resplit = resplit_probs(np.append(0, probs), e.strategy, e.rules)
+            self.profits = fold_profits(probs, e.pFirst, e.psFirst, e.pdRow, resplit)
+            self.advantage = float(np.sum(self.profits * probs))
+
+
+def _rank_index(rank):
+    # Index of a rank in A, 2..10 order
+    if isinstance(rank, str):
+        rank = rank.upper()
+        if rank not in RANKS:
+            raise ValueError(f"Unknown rank {rank!r}")
+        return RANKS.index(rank)
+    rank = int(rank)
+    if rank in (1, 11):
+        return 0
+    if 2 <= rank <= 10:
+        return rank - 1
+    raise ValueError(f"Unknown rank {rank!r}")
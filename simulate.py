@@ -0,0 +1,198 @@
+import numpy as np
+from types import SimpleNamespace
+import setup_variables
+from compute_term_profit import payoff_matrix
+from calc_player_trans import compile_player_trans
+from calc_player_trans_split import compile_player_trans_split, resplit_probs
+from calc_dealer_trans import compile_dealer_trans
+
+def simulate(strategy, hands, decks=6, penetration=0.75, deck=None, houseRules=None,
+             seed=None, shoes=100000):
+    """
+    Monte Carlo estimate of the player's advantage per hand: plays hands
+    rounds of one hand per shoe over shoes shoes at once, each round as a few
+    array operations over all shoes.  Cards come from shuffled shoes of decks
+    decks, reshuffled once penetration of the shoe is dealt (and mid-round if a
+    shoe runs out), or, with deck (10 probabilities, A, 2..10), are drawn
+    independently from it, as the Markov chains assume.  The player follows the
+    compiled chains of calc_player_trans / calc_player_trans_split for
+    strategy and houseRules (default: setup_variables.houseRules), playing
+    the hands of a split one after the other; with houseRules.MSA a hand
+    dealt the pair card again splits again, up to houseRules.MSH hands.
+    seed is anything np.random.default_rng takes; pass the children of one
+    np.random.SeedSequence to independent runs to combine them.
+    Returns a namespace with advantage, stderr, hands and variance.
+    """
+    if houseRules is None:
+        houseRules = setup_variables.houseRules
+    rng = np.random.default_rng(seed)
+
+    PLAYERfirst = setup_variables.PLAYERfirst
+    nextP,  closeP  = _tables(compile_player_trans(strategy, houseRules))
+    nextPS, closePS = _tables(compile_player_trans_split(strategy, houseRules))
+    nextD,  closeD  = _tables(compile_dealer_trans(houseRules))
+
+    nP = setup_variables.numPlayerStates
+    W = payoff_matrix()
+    splitCard = np.zeros(nP, dtype=int)
+    splitCard[setup_variables.PLAYERsplit[1:] - 1] = np.arange(2, 12)
+
+    # resplits[d, c]: a pair of c's is split again on dealer slice d
+    resplit = resplit_probs(np.ones(11), strategy, houseRules)
+    resplits = np.zeros((11, 12), dtype=bool)
+    if resplit is not None:
+        resplits[1:, 2:] = resplit.prob > 0
+
+    shoe = _Shoe(rng, shoes, decks, penetration, deck)
+    rounds = -(-hands // shoes)
+    total = 0.0
+    totalSq = 0.0
+    count = 0
+
+    for r in range(rounds):
+        n = min(shoes, hands - r * shoes)
+        shoe.start_round()
+        allHands = np.arange(n)
+
+        # Dealt in casino order: player, up-card, player, hole card
+        p1   = shoe.draw(allHands)
+        up   = shoe.draw(allHands)
+        p2   = shoe.draw(allHands)
+        hole = shoe.draw(allHands)
+
+        d = up                                       # dealer slice of the player's chains
+        s = nextP[d, PLAYERfirst[p1] - 1, p2]
+        sD = nextD[0, setup_variables.DEALERfirst[up] - 1, hole]
+        dealerBJ = sD == setup_variables.DEALERbj - 1
+        playerBJ = s == setup_variables.PLAYERbj - 1
+
+        # The dealer checks for blackjack before the player acts
+        live = np.flatnonzero(~dealerBJ)
+        s[live] = _play(shoe, nextP, closeP, d[live], s[live], live)
+
+        # Each split hand starts from one card of the pair in the split chain,
+        # one hand after the other, until none is left to play
+        splitHands = live[splitCard[s[live]] > 0]
+        pair = splitCard[s[splitHands]]
+        again = resplits[d[splitHands], pair]
+        splitFirst = PLAYERfirst[pair - 1] - 1
+        pending = np.full(len(splitHands), 2)
+        made = np.full(len(splitHands), 2)
+        finals = []
+        todo = np.arange(len(splitHands))
+        while len(todo):
+            cards = shoe.draw(splitHands[todo])
+            resplit = again[todo] & (cards + 1 == pair[todo]) & (made[todo] < houseRules.MSH)
+            made[todo[resplit]] += 1
+            pending[todo] += np.where(resplit, 1, -1)
+
+            play = todo[~resplit]
+            sH = nextPS[d[splitHands[play]], splitFirst[play], cards[~resplit]]
+            finals.append((play, _play(shoe, nextPS, closePS, d[splitHands[play]], sH, splitHands[play])))
+            todo = np.flatnonzero(pending > 0)
+
+        # The dealer draws only against a hand still standing
+        settled = np.zeros(nP, dtype=bool)
+        settled[[setup_variables.PLAYERbj - 1, setup_variables.PLAYERsurrender - 1,
+                 setup_variables.PLAYERbust - 1, setup_variables.PLAYERdoubBust - 1]] = True
+        standing = ~settled[s]
+        standing[splitHands] = False
+        for play, sH in finals:
+            standing[splitHands[play]] |= ~settled[sH]
+        dealt = live[standing[live]]
+        sD[dealt] = _play(shoe, nextD, closeD, np.zeros(len(dealt), dtype=int), sD[dealt], dealt)
+
+        profit = np.where(playerBJ, 0.0, -1.0)
+        profit[live] = W[s[live], sD[live]]
+        for play, sH in finals:
+            profit[splitHands[play]] += W[sH, sD[splitHands[play]]]
+
+        total += profit.sum()
+        totalSq += np.dot(profit, profit)
+        count += n
+
+    result = SimpleNamespace()
+    result.hands = count
+    result.advantage = total / count
+    result.variance = totalSq / count - result.advantage**2
+    result.stderr = np.sqrt(result.variance / count)
+    return result
+
+
+def _tables(topo):
+    """
+    Lookup tables for walking a compiled topology hand by hand:
+    next[d, s, k] is the state after drawing card k + 1 in state s (-1 if s
+    does not draw), close[d, s] the state reached from s by sure moves alone.
+    """
+    shape3 = topo.shape if len(topo.shape) == 3 else (1,) + topo.shape
+    blocks, n, _ = shape3
+
+    draw = topo.rank_idx >= 0
+    nxt = np.full((blocks, n, 11), -1, dtype=np.intp)
+    nxt[topo.dealer_idx[draw], topo.from_idx[draw], topo.rank_idx[draw]] = topo.to_idx[draw]
+
+    close = np.tile(np.arange(n), (blocks, 1))
+    sure = ~draw
+    close[topo.dealer_idx[sure], topo.from_idx[sure]] = topo.to_idx[sure]
+    rows = np.arange(blocks)[:, None]
+    for _ in range(n):
+        step = close[rows, close]
+        if np.array_equal(step, close):
+            break
+        close = step
+    return nxt, close
+
+
+def _play(shoe, nxt, close, d, s, hands):
+    """
+    Plays the hands (indices into the shoes) from states s to absorbing
+    states, drawing from their shoes.  Returns the final states.
+    """
+    s = close[d, s]
+    todo = np.flatnonzero(nxt[d, s, 1] >= 0)
+    while len(todo):
+        cards = shoe.draw(hands[todo])
+        s[todo] = close[d[todo], nxt[d[todo], s[todo], cards]]
+        todo = todo[nxt[d[todo], s[todo], 1] >= 0]
+    return s
+
+
+class _Shoe:
+    """
+    Card source for simulate: one shuffled shoe per parallel hand, or
+    independent draws from a deck distribution.  Cards are 1..10 for 2..11.
+    """
+    def __init__(self, rng, shoes, decks, penetration, deck):
+        self.rng = rng
+        if deck is not None:
+            deck = np.asarray(deck, dtype=float)
+            deck = np.append(deck[1:], deck[0]) / np.sum(deck)
+            self.cdf = np.cumsum(deck)
+            self.cdf[-1] = 1.0
+            return
+        self.cdf = None
+
+        counts = (np.array([4, 4, 4, 4, 4, 4, 4, 4, 16, 4]) * decks).astype(int)   # cards 2..11
+        cards = np.repeat(np.arange(1, 11, dtype=np.int8), counts)
+        self.size = len(cards)
+        self.cut = int(penetration * self.size)
+        self.cards = rng.permuted(np.tile(cards, (shoes, 1)), axis=1)
+        self.pos = np.zeros(shoes, dtype=np.intp)
+
+    def start_round(self):
+        if self.cdf is None:
+            self.reshuffle(np.flatnonzero(self.pos >= self.cut))
+
+    def reshuffle(self, shoes):
+        if len(shoes):
+            self.cards[shoes] = self.rng.permuted(self.cards[shoes], axis=1)
+            self.pos[shoes] = 0
+
+    def draw(self, shoes):
+        if self.cdf is not None:
+            return np.searchsorted(self.cdf, self.rng.random(len(shoes)), side='right') + 1
+        self.reshuffle(shoes[self.pos[shoes] >= self.size])
+        cards = self.cards[shoes, self.pos[shoes]].astype(np.intp)
+        self.pos[shoes] += 1
+        return cards
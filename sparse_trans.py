@@ -0,0 +1,129 @@
+import numpy as np
+from types import SimpleNamespace
+
+def coo_to_csr(shape, block, row, col, data):
+    """
+    Builds an array-backed CSR for a stack of square transition matrices of
+    shape (blocks, n, n) from (block, row, col) coordinates.  Row b*n + s of
+    the CSR is row s of block b; repeated coordinates add up.  data may carry
+    leading batch axes, shape (..., nnz), so one structure can serve many decks.
+    """
+    return csr_with_data(csr_pattern(shape, block, row, col), data)
+
+
+def csr_pattern(shape, block, row, col):
+    """
+    The structure coo_to_csr builds from the coordinates, without data:
+    shape, indptr, indices, the order that sorts data into the CSR, and
+    plans, where absorb_rows_csr keeps its schedules for this pattern.
+    Build it once per pattern and fill it with csr_with_data per deck.
+    """
+    blocks, n, _ = shape
+    rows  = np.asarray(block) * n + np.asarray(row)
+    order = np.lexsort((col, rows))
+
+    pattern = SimpleNamespace()
+    pattern.shape   = shape
+    pattern.indptr  = np.searchsorted(rows[order], np.arange(blocks * n + 1))
+    pattern.indices = np.asarray(col)[order]
+    pattern.order   = order
+    pattern.plans   = {}
+    return pattern
+
+
+def csr_with_data(pattern, data):
+    """
+    CSR of a pattern (see csr_pattern) holding data, in coordinate order,
+    shape (..., nnz).
+    """
+    Pcsr = SimpleNamespace()
+    Pcsr.shape   = pattern.shape
+    Pcsr.indptr  = pattern.indptr
+    Pcsr.indices = pattern.indices
+    Pcsr.data    = np.asarray(data, dtype=float)[..., pattern.order]
+    Pcsr.plans   = pattern.plans
+    return Pcsr
+
+
+def absorb_rows_csr(Pcsr, levels, rows):
+    """
+    Sparse counterpart of absorb_chain.absorb_rows: pushes the start states
+    rows (state names) through the transient groups of every block, touching
+    only the stored entries.  Returns an array of shape (..., blocks, len(rows), n).
+    Each level is one gather of its entries, grouped by target row, and one
+    np.add.reduceat, following a schedule kept with the pattern (see
+    _level_plan).  Each level costs a few numpy calls, so for one deck of
+    the 122-state chains this is still slower than the dense sweep (about
+    4 ms against 3 ms for adv_single_hand); on batches, where it stores only
+    the CSR data instead of (N, 10, 122, 122) stacks, it is also faster
+    (about 460 ms against 600 ms for 200 decks).
+    """
+    blocks, n, _ = Pcsr.shape
+    m = len(rows)
+    V = np.zeros((blocks, m, n), dtype=float)
+    V[:, np.arange(m), rows - 1] = 1
+    return absorb_vectors_csr(Pcsr, levels, V)
+
+
+def absorb_vectors_csr(Pcsr, levels, V):
+    """
+    Sparse counterpart of absorb_chain.absorb_vectors: pushes the start
+    distributions V (shape (blocks, m, n), or with the leading axes of
+    Pcsr.data) through the transient groups of every block, as
+    absorb_rows_csr does for unit rows.  Returns a new array of shape
+    (..., blocks, m, n).
+    """
+    blocks, n, _ = Pcsr.shape
+    lead = Pcsr.data.shape[:-1]
+    N = int(np.prod(lead))
+    m = V.shape[-2]
+
+    # State-major layout, so a level's rows are gathered and summed along the first axis
+    V = np.broadcast_to(V, lead + (blocks, m, n)).reshape(N, blocks, m, n)
+    V = np.ascontiguousarray(V.transpose(1, 3, 0, 2)).reshape(blocks * n, N, m)
+    dataT = np.ascontiguousarray(Pcsr.data.reshape(N, -1).T)     # shape: (nnz, N)
+
+    for srcRows, entry, src, runs, runDst in reversed(_level_plan(Pcsr, levels)):
+        if len(entry):
+            mass = V[src] * dataT[entry][:, :, None]
+            V[srcRows] = 0
+            V[runDst] += np.add.reduceat(mass, runs, axis=0)
+        else:
+            V[srcRows] = 0
+
+    V = V.reshape((blocks, n, N, m)).transpose(2, 0, 3, 1)
+    return V.reshape(lead + (blocks, m, n))
+
+
+def _level_plan(Pcsr, levels):
+    """
+    Per level of levels: the CSR rows of its states, its stored entries
+    sorted by target row with their source rows, where each run of one
+    target starts (within the level), and the run's target row.  Depends
+    only on the pattern, so it is cached in Pcsr.plans if there is one.
+    """
+    plans = getattr(Pcsr, 'plans', None)
+    key = b''.join(np.asarray(states).tobytes() + b'|' for states in levels)
+    if plans is not None and key in plans:
+        return plans[key]
+
+    blocks, n, _ = Pcsr.shape
+    level = np.full(n, len(levels))
+    for k, states in enumerate(levels):
+        level[states - 1] = k
+    src = np.repeat(np.arange(blocks * n), np.diff(Pcsr.indptr))
+    dst = (src // n) * n + Pcsr.indices
+    order = np.argsort(level[src % n] * (blocks * n) + dst, kind='stable')
+    lev = level[src[order] % n]
+    levelStart = np.searchsorted(lev, np.arange(len(levels) + 1))
+
+    plan = []
+    for k, states in enumerate(levels):
+        entry = order[levelStart[k]:levelStart[k + 1]]
+        runs = np.flatnonzero(np.diff(dst[entry], prepend=-1))
+        srcRows = (np.arange(blocks)[:, None] * n + (states - 1)).ravel()
+        plan.append((srcRows, entry, src[entry], runs, dst[entry][runs]))
+
+    if plans is not None:
+        plans[key] = plan
+    return plan
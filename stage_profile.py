@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Opt-in per-stage instrumentation.  While disabled, stage() hands back a
+# shared no-op context, so the instrumented code pays one function call.
+
+_enabled  = False
+_memory   = False
+_tracing  = False   # Whether enable() started tracemalloc (and disable() may stop it)
+_callback = None
+_stats    = {}
+_open     = []      # [start bytes, peak bytes] of the stages running with memory, innermost last
+_lock     = threading.Lock()
+_noop     = nullcontext()
+
+def enable(callback=None, memory=False):
+    """
+    Starts recording wall time and call counts per stage.  With memory=True,
+    also records the bytes allocated at peak inside each stage (via tracemalloc,
+    which slows everything down); stages may nest, an outer stage's peak
+    covering its inner ones, but tracemalloc's peak is process-wide, so
+    measure memory from one thread at a time.  callback(name, seconds,
+    nbytes) is called after every stage, nbytes being None without memory.
+    """
+    global _enabled, _memory, _tracing, _callback
+    _memory = memory
+    _callback = callback
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracing = True
+    _enabled = True
+
+
+def disable():
+    """
+    Stops recording; the counters are kept until reset().  tracemalloc is
+    stopped only if enable() started it.
+    """
+    global _enabled, _tracing, _callback
+    _enabled = False
+    _callback = None
+    if _tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _tracing = False
+
+
+def reset():
+    """
+    Clears the counters.
+    """
+    with _lock:
+        _stats.clear()
+
+
+def snapshot():
+    """
+    The counters as a dict: stage name -> {'calls', 'seconds', 'bytes'},
+    bytes staying 0 unless recording with memory=True.
+    """
+    with _lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def snapshot_json(**kwargs):
+    """
+    snapshot() as a JSON string; kwargs go to json.dumps.
+    """
+    return json.dumps(snapshot(), **kwargs)
+
+
+def stage(name):
+    """
+    Context manager timing one run of the stage name, if recording is enabled.
+    """
+    if not _enabled:
+        return _noop
+    return _record(name)
+
+
+@contextmanager
+def _record(name):
+    memory = _memory and tracemalloc.is_tracing()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        with _lock:
+            # Resetting the peak would lose the enclosing stage's: keep it on its frame
+            if _open:
+                _open[-1][1] = max(_open[-1][1], peak)
+            frame = [current, current]
+            _open.append(frame)
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        nbytes = None
+        if memory:
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            nbytes = peak - frame[0]
+            with _lock:
+                _open[:] = [f for f in _open if f is not frame]
+                if _open:
+                    _open[-1][1] = max(_open[-1][1], peak)
+        with _lock:
+            s = _stats.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+            s['calls'] += 1
+            s['seconds'] += seconds
+            if nbytes is not None:
+                s['bytes'] += nbytes
+        if _callback is not None:
+            _callback(name, seconds, nbytes)
@@ -0,0 +1,119 @@
+import argparse
+import csv
+import itertools
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+import setup_variables
+from set_strategy import set_strategy
+from engine import Engine
+
+RULE_FLAGS = ('DSSS', 'DASA', 'MSA', 'MSH', 'HASAA', 'SRA')
+RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10')
+
+def sweep_rules(rulesGrid, decks, strategies=('basic',), workers=None):
+    """
+    Evaluates the player's advantage for every combination of house rules x
+    strategy x deck composition, fanned out over a process pool (one task per
+    rule set and strategy, each evaluating all decks in one batch).
+    rulesGrid maps rule names (see RULE_FLAGS) to lists of values; rules left
+    out keep their values in setup_variables.houseRules.  decks is an (M, 10)
+    array of deck distributions, strategies a list of set_strategy types;
+    'optimal' is solved afresh for each deck.
+    Returns the result table as a dict of equal-length columns.
+    """
+    if not hasattr(setup_variables, 'houseRules'):
+        setup_variables.setup_variables()
+    defaults = setup_variables.houseRules
+
+    unknown = set(rulesGrid) - set(RULE_FLAGS)
+    if unknown:
+        raise ValueError(f"Unknown house rules {sorted(unknown)}")
+
+    values = [rulesGrid.get(flag, [getattr(defaults, flag)]) for flag in RULE_FLAGS]
+    configs = [(flags, name) for flags in itertools.product(*values) for name in strategies]
+
+    decks = np.atleast_2d(np.array(decks, dtype=float))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_sweep_task, configs, itertools.repeat(decks)))
+
+    table = {flag: [] for flag in RULE_FLAGS}
+    table['strategy'] = []
+    table['deck'] = []
+    for (flags, name), adv in zip(configs, results):
+        for flag, value in zip(RULE_FLAGS, flags):
+            table[flag].extend([value] * len(decks))
+        table['strategy'].extend([name] * len(decks))
+        table['deck'].extend(range(len(decks)))
+
+    table = {col: np.array(vals) for col, vals in table.items()}
+    for j, rank in enumerate(RANKS):
+        table['p' + rank] = np.tile(decks[:, j], len(configs))
+    table['advantage'] = np.concatenate(results)
+    return table
+
+
+def write_table(table, path):
+    """
+    Writes a sweep table to path; the format follows the extension
+    (.csv, .npz, or .parquet, which needs pandas with a parquet engine).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(table.keys())
+            writer.writerows(zip(*table.values()))
+    elif ext == '.npz':
+        np.savez(path, **table)
+    elif ext == '.parquet':
+        import pandas as pd
+        pd.DataFrame(table).to_parquet(path)
+    else:
+        raise ValueError(f"Unknown table format {ext!r}")
+
+
+def _sweep_task(config, decks):
+    flags, name = config
+    if not hasattr(setup_variables, 'houseRules'):
+        setup_variables.setup_variables()
+    rules = SimpleNamespace(**vars(setup_variables.houseRules))
+    rules.__dict__.update(zip(RULE_FLAGS, flags))
+    if name == 'optimal':
+        return np.array([Engine(rules, set_strategy(name, rules, deck)).advantage(deck) for deck in decks])
+    engine = Engine(rules, set_strategy(name, rules))
+    return engine.advantage_batch(decks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the player's advantage over house rules, strategies and decks.")
+    parser.add_argument('--rules', nargs='*', default=[], metavar='FLAG=V1,V2',
+                        help="rule values to sweep, e.g. DSSS=0,1 MSA=0,1 MSH=2,3,4 (others keep their defaults)")
+    parser.add_argument('--decks', default=None,
+                        help="text file with one deck per row: 10 rank counts or probabilities, A..10 "
+                             "(default: a standard deck)")
+    parser.add_argument('--strategies', nargs='*', default=['basic'])
+    parser.add_argument('--workers', type=int, default=None, help="process count (default: all cores)")
+    parser.add_argument('--out', default='sweep.csv', help="output table (.csv, .npz or .parquet)")
+    args = parser.parse_args(argv)
+
+    rulesGrid = {}
+    for item in args.rules:
+        flag, _, vals = item.partition('=')
+        rulesGrid[flag] = [int(v) for v in vals.split(',')]
+
+    if args.decks is None:
+        decks = np.array([[1, 1, 1, 1, 1, 1, 1, 1, 1, 4]], dtype=float)
+    else:
+        decks = np.atleast_2d(np.loadtxt(args.decks, delimiter=',' if args.decks.endswith('.csv') else None))
+    decks = decks / decks.sum(axis=1, keepdims=True)
+
+    table = sweep_rules(rulesGrid, decks, args.strategies, args.workers)
+    write_table(table, args.out)
+    print(f"Wrote {len(table['advantage'])} rows to {args.out}")
+
+
+if __name__ == '__main__':
+    main()